@@ -0,0 +1,201 @@
+import argparse
+import glob
+import json
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from file_handler import read_file
+from scheduler import ALGORITHMS
+from stopping import StoppingCriteria
+
+data_dir = "data"
+results_dir = "results"
+
+# Metrics compared against the baseline, and whether larger values are worse
+COMPARED_METRICS = {
+    "wall_time": True,
+    "peak_rss_mb": True,
+    "evaluations_per_second": False,
+}
+
+
+# Runs one solver on one instance and measures it. Called in a fresh worker
+# process so that peak RSS belongs to this run alone. Wall time covers solver
+# construction and run(); the instance is parsed and its distance matrix built
+# beforehand. Evaluations are counted through a StoppingCriteria without limits.
+def run_case(file_path, algorithm, params, seed):
+    instance = read_file(file_path, rounded=True)
+    instance.distance_matrix
+
+    stopping = StoppingCriteria()
+    start = time.perf_counter()
+    result = ALGORITHMS[algorithm](instance, seed=seed).run(**params, stopping=stopping)
+    wall_time = time.perf_counter() - start
+
+    _, best_fitness, _, _, total_distance, number_of_vehicles = result
+    gap = None
+    if instance.best_known:
+        gap = 100 * (total_distance - instance.best_known) / instance.best_known
+
+    return {
+        "instance": instance.name or os.path.basename(file_path),
+        "algorithm": algorithm,
+        "params": params,
+        "seed": seed,
+        "wall_time": wall_time,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "evaluations": stopping.evaluations,
+        "evaluations_per_second": stopping.evaluations / wall_time,
+        "best_fitness": best_fitness,
+        "total_distance": total_distance,
+        "number_of_vehicles": number_of_vehicles,
+        "best_known": instance.best_known,
+        "gap": gap,
+    }
+
+
+# Runs every case repeats times, one at a time and each in a new process, and
+# keeps the fastest run (runs are seeded, so they only differ in timing)
+def run_benchmark(file_paths, algorithms, iterations, generations, seed, repeats):
+    records = []
+    for file_path in file_paths:
+        for algorithm in algorithms:
+            params = (
+                {"generations": generations}
+                if algorithm == "GeneticAlgorithm"
+                else {"iterations": iterations}
+            )
+            runs = []
+            for _ in range(repeats):
+                with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as pool:
+                    runs.append(
+                        pool.submit(
+                            run_case, file_path, algorithm, params, seed
+                        ).result()
+                    )
+            record = min(runs, key=lambda run: run["wall_time"])
+            record["peak_rss_mb"] = max(run["peak_rss_mb"] for run in runs)
+            records.append(record)
+            print_record(record)
+    return records
+
+
+def print_record(record):
+    gap = "-" if record["gap"] is None else f"{record['gap']:.2f}%"
+    print(
+        f"{record['instance']:<12} {record['algorithm']:<18}"
+        f" {record['wall_time']:9.3f} s {record['peak_rss_mb']:8.1f} MB"
+        f" {record['evaluations_per_second']:12.0f} evals/s"
+        f" {record['total_distance']:10.1f} gap {gap}"
+    )
+
+
+# Regressions of records against a baseline (as saved by --save-baseline). A
+# metric regresses when it is worse than the baseline by more than tolerance
+# (relative), the gap when it grows by more than gap_tolerance percent points.
+def compare(records, baseline, tolerance, gap_tolerance):
+    baseline = {
+        (record["instance"], record["algorithm"]): record
+        for record in baseline["records"]
+    }
+    regressions = []
+    for record in records:
+        base = baseline.get((record["instance"], record["algorithm"]))
+        if base is None:
+            continue
+        name = f"{record['instance']} {record['algorithm']}"
+
+        for metric, larger_is_worse in COMPARED_METRICS.items():
+            value, reference = record[metric], base[metric]
+            ratio = value / reference if larger_is_worse else reference / value
+            if ratio > 1 + tolerance:
+                regressions.append(
+                    f"{name}: {metric} {value:.4g} vs baseline {reference:.4g}"
+                    f" ({(ratio - 1) * 100:.0f}% worse)"
+                )
+
+        if (
+            record["gap"] is not None
+            and base["gap"] is not None
+            and record["gap"] > base["gap"] + gap_tolerance
+        ):
+            regressions.append(
+                f"{name}: gap {record['gap']:.2f}% vs baseline {base['gap']:.2f}%"
+            )
+    return regressions
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the solvers on the instances in data/*.vrp"
+    )
+    parser.add_argument(
+        "instances",
+        nargs="*",
+        help="instance files (default: every .vrp file in the data directory)",
+    )
+    parser.add_argument("--data-dir", default=data_dir)
+    parser.add_argument(
+        "--algorithms", nargs="+", choices=list(ALGORITHMS), default=list(ALGORITHMS)
+    )
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--generations", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", default=os.path.join(results_dir, "benchmark.json"))
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", help="write the results as a baseline")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="allowed relative slowdown before failing (default: 0.2)",
+    )
+    parser.add_argument(
+        "--gap-tolerance",
+        type=float,
+        default=1.0,
+        help="allowed growth of the gap in percent points (default: 1.0)",
+    )
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(args)
+    file_paths = args.instances or sorted(
+        glob.glob(os.path.join(args.data_dir, "*.vrp"))
+    )
+
+    records = run_benchmark(
+        file_paths,
+        args.algorithms,
+        args.iterations,
+        args.generations,
+        args.seed,
+        args.repeats,
+    )
+    report = {"python": sys.version.split()[0], "records": records}
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(records, baseline, args.tolerance, args.gap_tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} REGRESSION(S) against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import os
+import timeit
+import numpy as np
+from file_handler import read_file
+from genetic_algorithm import order_crossover, order_crossover_batch
+
+data_dir = "data"
+
+
+# The original list-based OX fill, kept as the baseline: the membership test
+# scans the child list, so each child costs O(n^2)
+def order_crossover_list(parent1, parent2, start, end):
+    child = [-1] * len(parent1)
+    child[start:end] = parent1[start:end]
+
+    p2_index = 0
+    for i in range(len(child)):
+        if child[i] == -1:
+            while parent2[p2_index] in child:
+                p2_index += 1
+            child[i] = parent2[p2_index]
+    return child
+
+
+def benchmark(name, customers, children=100, repeat=5):
+    rng = np.random.default_rng(0)
+    parents1 = np.array([rng.permutation(customers) for _ in range(children)])
+    parents2 = np.array([rng.permutation(customers) for _ in range(children)])
+    points = np.sort(rng.integers(0, len(customers), (children, 2)), axis=1)
+    starts, ends = points[:, 0], points[:, 1]
+
+    lists1 = parents1.tolist()
+    lists2 = parents2.tolist()
+
+    def run_list():
+        for k in range(children):
+            order_crossover_list(lists1[k], lists2[k], starts[k], ends[k])
+
+    def run_mask():
+        for k in range(children):
+            order_crossover(parents1[k], parents2[k], starts[k], ends[k])
+
+    def run_batch():
+        order_crossover_batch(parents1, parents2, starts, ends)
+
+    print(f"{name}: {len(customers)} customers, {children} children")
+    baseline = None
+    for label, function in [
+        ("list", run_list),
+        ("mask", run_mask),
+        ("batch", run_batch),
+    ]:
+        seconds = min(timeit.repeat(function, number=1, repeat=repeat))
+        baseline = baseline or seconds
+        print(f"  {label:>5}: {seconds * 1000:9.2f} ms  ({baseline / seconds:7.1f}x)")
+
+
+if __name__ == "__main__":
+    instance = read_file(os.path.join(data_dir, "A-n80-k10.vrp"))
+    customers = [
+        node for node in range(1, instance.dimension + 1) if node != instance.depot
+    ]
+    benchmark("A-n80-k10", np.array(customers, dtype=np.int32))
+
+    benchmark("Synthetic", np.arange(2, 2002, dtype=np.int32), repeat=1)
@@ -0,0 +1,122 @@
+import numpy as np
+from file_handler import atomic_save
+from giant_tour import GiantTour
+
+# Checkpoint files hold the state of an interrupted run as compressed NumPy
+# arrays (.npz), written atomically, so a preempted run leaves either the
+# previous or the new checkpoint behind, never a partial one. Every value is
+# stored exactly (fitness values as float64, the generator state as its 625
+# words), so a resumed run continues exactly as the uninterrupted run would.
+
+
+def save_checkpoint(path, solver, instance, **arrays):
+    atomic_save(
+        path,
+        np.savez_compressed,
+        solver=solver,
+        dimension=instance.dimension,
+        **arrays,
+    )
+
+
+# Arrays of a checkpoint written by save_checkpoint for the given solver and
+# instance
+def load_checkpoint(path, solver, instance):
+    with np.load(path) as data:
+        state = {key: data[key] for key in data.files}
+    if str(state["solver"]) != solver:
+        raise ValueError(f"{path} is a {state['solver']} checkpoint, not {solver}")
+    if int(state["dimension"]) != instance.dimension:
+        raise ValueError(f"{path} was written for another instance")
+    return state
+
+
+def encode_random(rng):
+    version, words, gauss_next = rng.getstate()
+    return {
+        "random_version": version,
+        "random_words": np.array(words, dtype=np.uint64),
+        "random_gauss": np.nan if gauss_next is None else gauss_next,
+    }
+
+
+def restore_random(rng, state):
+    gauss_next = float(state["random_gauss"])
+    rng.setstate(
+        (
+            int(state["random_version"]),
+            tuple(state["random_words"].tolist()),
+            None if np.isnan(gauss_next) else gauss_next,
+        )
+    )
+
+
+# Population of (GiantTour, fitness) pairs as concatenated arrays plus the
+# number of routes of every individual
+def encode_population(population_fitness):
+    individuals = [individual for individual, _ in population_fitness]
+    return {
+        "tours": np.stack([individual.tour for individual in individuals]),
+        "route_counts": np.array(
+            [len(individual.costs) for individual in individuals], dtype=np.int64
+        ),
+        "starts": np.concatenate([individual.starts for individual in individuals]),
+        "loads": np.concatenate([individual.loads for individual in individuals]),
+        "costs": np.concatenate([individual.costs for individual in individuals]),
+        "fitness": np.array(
+            [fitness for _, fitness in population_fitness], dtype=np.float64
+        ),
+    }
+
+
+def decode_population(state):
+    population_fitness = []
+    route_offset = 0
+    for idx, route_count in enumerate(state["route_counts"].tolist()):
+        routes = slice(route_offset, route_offset + route_count)
+        starts = slice(route_offset + idx, route_offset + idx + route_count + 1)
+        individual = GiantTour(
+            state["tours"][idx].copy(),
+            state["starts"][starts].copy(),
+            state["loads"][routes].copy(),
+            state["costs"][routes].copy(),
+        )
+        fitness, total_distance, number_of_vehicles = state["fitness"][idx].tolist()
+        population_fitness.append(
+            (individual, (fitness, total_distance, int(number_of_vehicles)))
+        )
+        route_offset += route_count
+    return population_fitness
+
+
+# A list of routes as its chained nodes and the length of every route
+def encode_solution(solution, name):
+    return {
+        f"{name}_nodes": np.array(
+            [node for route in solution for node in route], dtype=np.int64
+        ),
+        f"{name}_lengths": np.array([len(route) for route in solution], np.int64),
+    }
+
+
+def decode_solution(state, name):
+    nodes = state[f"{name}_nodes"].tolist()
+    solution = []
+    offset = 0
+    for length in state[f"{name}_lengths"].tolist():
+        solution.append(nodes[offset : offset + length])
+        offset += length
+    return solution
+
+
+# Tabu memory as rows of (customer, route_idx, position, expiry)
+def encode_tabu_list(tabu_list):
+    rows = [key + (expiry,) for key, expiry in tabu_list.items()]
+    return np.array(rows, dtype=np.int64).reshape(-1, 4)
+
+
+def decode_tabu_list(array):
+    return {
+        (customer, route_idx, position): expiry
+        for customer, route_idx, position, expiry in array.tolist()
+    }
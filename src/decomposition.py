@@ -0,0 +1,250 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from instance import Instance
+from scheduler import ALGORITHMS
+from utils import calculate_fitness, make_rng
+
+PARTITIONS = ("sweep", "routes")
+
+# Solvers whose run() takes an initial population rather than a solution
+POPULATION_SOLVERS = ("GeneticAlgorithm",)
+
+
+# Sub-problem of instance with the depot and the given customers, renumbered
+# as nodes 1 (the depot), 2, 3, ... Its distance matrix is cut out of the
+# instance's, so only the distances within the part are ever computed.
+def sub_instance(instance, customers):
+    nodes = np.array([instance.depot] + list(customers), dtype=np.intp)
+    node_coords = np.asarray(instance.node_coords, dtype=np.float64)[nodes - 1]
+    node_coords[:, 0] = np.arange(1, len(nodes) + 1)
+    return Instance(
+        len(nodes),
+        instance.capacity,
+        node_coords,
+        [
+            (idx, instance.demands[node - 1][1])
+            for idx, node in enumerate(nodes.tolist(), 1)
+        ],
+        1,
+        rounded=instance.rounded,
+        dtype=instance.dtype,
+        edge_weight_type=instance.edge_weight_type,
+        distance_matrix=np.asarray(
+            instance.distance_matrix[nodes[:, None] - 1, nodes - 1]
+        ),
+    )
+
+
+# Solves one part in a worker process. routes (in the part's numbering) are
+# the part's current routes, used as the warm start; the result is only kept
+# if it improves on them. Returns the part's routes and fitness.
+def solve_part(instance, routes, algorithm, params, seed):
+    params = dict(params)
+    if routes:
+        if algorithm in POPULATION_SOLVERS:
+            params["initial_population"] = [routes]
+        else:
+            params["initial_solution"] = routes
+    solution, fitness, _, _, _, _ = ALGORITHMS[algorithm](instance, seed=seed).run(
+        **params
+    )
+
+    if routes:
+        current_fitness = calculate_fitness(routes, instance.distance_matrix)[0]
+        if current_fitness <= fitness:
+            return routes, current_fitness
+    return solution, fitness
+
+
+# Decomposition meta-solver for large instances. The customers are split into
+# parts of about part_size customers, every part is solved as an independent
+# CVRP by one of the solvers in scheduler.ALGORITHMS (in worker processes),
+# and the part solutions are stitched into one solution. Each following round
+# re-partitions the current routes and re-solves every part, warm-started from
+# its routes, so boundaries between parts move from round to round:
+#   sweep   routes are ordered by the polar angle of their barycenter around
+#           the depot, starting from a random route, and cut into consecutive
+#           groups (the first round sweeps the customers themselves)
+#   routes  route barycenters are clustered with k-means, and clusters with
+#           more than part_size customers are cut like the sweep partition
+# Parts have a bounded size, so the work per round grows linearly with the
+# number of customers.
+class DecompositionSolver:
+    # seed: int, None or a random.Random to draw the part seeds from
+    def __init__(self, instance, seed=None):
+        if instance.node_coords is None:
+            raise ValueError("Decomposition needs node coordinates")
+        self.instance = instance
+        self.depot = instance.depot
+        self.distance_matrix = instance.distance_matrix
+        coords = np.asarray(instance.node_coords, dtype=np.float64)
+        self.x = coords[:, 1]
+        self.y = coords[:, 2]
+        self.random = make_rng(seed)
+
+    def angles(self, x, y):
+        return np.arctan2(y - self.y[self.depot - 1], x - self.x[self.depot - 1])
+
+    def barycenters(self, solution):
+        return np.array(
+            [
+                (
+                    self.x[np.array(route[1:-1]) - 1].mean(),
+                    self.y[np.array(route[1:-1]) - 1].mean(),
+                )
+                for route in solution
+            ]
+        )
+
+    # Consecutive groups of items (in the given order, rotated to start at a
+    # random item) of at least part_size customers each. A short last group is
+    # merged into the first one, which follows it in the circular order.
+    def cut(self, order, sizes, part_size):
+        start = self.random.randrange(len(order))
+        groups = [[]]
+        count = 0
+        for item in order[start:] + order[:start]:
+            if count >= part_size:
+                groups.append([])
+                count = 0
+            groups[-1].append(item)
+            count += sizes[item]
+        if len(groups) > 1 and count < part_size / 2:
+            groups[0].extend(groups.pop())
+        return groups
+
+    # Parts of the customers for the first round, by polar sweep
+    def sweep_customers(self, part_size):
+        customers = np.array(self.instance.customers)
+        order = customers[
+            np.argsort(self.angles(self.x[customers - 1], self.y[customers - 1]))
+        ].tolist()
+        return [
+            (group, []) for group in self.cut(order, dict.fromkeys(order, 1), part_size)
+        ]
+
+    # Groups of route indices of the solution
+    def partition_routes(self, solution, partition, part_size):
+        centers = self.barycenters(solution)
+        sizes = [len(route) - 2 for route in solution]
+
+        if partition == "sweep":
+            order = np.argsort(self.angles(centers[:, 0], centers[:, 1])).tolist()
+            return self.cut(order, sizes, part_size)
+
+        # k-means on the barycenters, k = number of parts of part_size
+        k = min(len(solution), max(1, math.ceil(sum(sizes) / part_size)))
+        means = centers[self.random.sample(range(len(solution)), k)]
+        for _ in range(10):
+            labels = np.argmin(
+                ((centers[:, None, :] - means[None, :, :]) ** 2).sum(axis=2), axis=1
+            )
+            for cluster in range(k):
+                members = centers[labels == cluster]
+                if len(members):
+                    means[cluster] = members.mean(axis=0)
+
+        # Clusters are not size-limited, so the ones with more than part_size
+        # customers (around a dense area) are swept and cut like the sweep
+        # partition, keeping every part bounded
+        angles = self.angles(centers[:, 0], centers[:, 1])
+        groups = []
+        for cluster in range(k):
+            members = np.flatnonzero(labels == cluster)
+            if not len(members):
+                continue
+            if sum(sizes[route_idx] for route_idx in members.tolist()) <= part_size:
+                groups.append(members.tolist())
+            else:
+                order = members[np.argsort(angles[members])].tolist()
+                groups.extend(self.cut(order, sizes, part_size))
+        return groups
+
+    # The parts of a round as (customers, routes) pairs
+    def partition(self, solution, partition, part_size):
+        if solution is None:
+            return self.sweep_customers(part_size)
+        parts = []
+        for group in self.partition_routes(solution, partition, part_size):
+            routes = [solution[route_idx] for route_idx in group]
+            parts.append(([node for route in routes for node in route[1:-1]], routes))
+        return parts
+
+    # rounds: number of partition and solve rounds. algorithm: key of
+    # scheduler.ALGORITHMS that solves the parts, with run(**params).
+    # part_size: customers per part. initial_solution: a solution to start
+    # from instead of solving the sweep partition first.
+    def run(
+        self,
+        rounds=5,
+        algorithm="TabuSearch",
+        params=None,
+        part_size=100,
+        partition="sweep",
+        workers=None,
+        stopping=None,
+        initial_solution=None,
+    ):
+        if partition not in PARTITIONS:
+            raise ValueError(f"Unknown partition: {partition}")
+        if stopping is not None:
+            stopping.start()
+        params = params or {}
+
+        solution = initial_solution
+        worst_fitness = float("-inf")
+        total_fitness_sum = 0
+        completed_rounds = 0
+
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            for _ in range(rounds):
+                parts = self.partition(solution, partition, part_size)
+                futures = []
+                for customers, routes in parts:
+                    numbering = {node: idx for idx, node in enumerate(customers, 2)}
+                    numbering[self.depot] = 1
+                    futures.append(
+                        executor.submit(
+                            solve_part,
+                            sub_instance(self.instance, customers),
+                            [[numbering[node] for node in route] for route in routes],
+                            algorithm,
+                            params,
+                            self.random.getrandbits(64),
+                        )
+                    )
+
+                # Stitch the part solutions back into the original numbering
+                solution = []
+                for (customers, _), future in zip(parts, futures):
+                    nodes = [self.depot] + customers
+                    part_solution, _ = future.result()
+                    solution.extend(
+                        [nodes[node - 1] for node in route] for route in part_solution
+                    )
+
+                fitness = calculate_fitness(solution, self.distance_matrix)[0]
+                worst_fitness = max(worst_fitness, fitness)
+                total_fitness_sum += fitness
+                completed_rounds += 1
+
+                if stopping is not None and stopping.update(
+                    fitness, solution, len(parts)
+                ):
+                    break
+
+        average_fitness = total_fitness_sum / completed_rounds
+
+        best_fitness, best_total_distance, best_number_of_vehicles = calculate_fitness(
+            solution, self.distance_matrix
+        )
+        return (
+            solution,
+            best_fitness,
+            worst_fitness,
+            average_fitness,
+            best_total_distance,
+            best_number_of_vehicles,
+        )
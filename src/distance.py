@@ -0,0 +1,155 @@
+import atexit
+import os
+import tempfile
+from collections import OrderedDict
+import numpy as np
+from utils import calculate_distance_matrix, euclidean_distance
+
+# Distance backends an Instance can use (see create_distances):
+#   dense      the full matrix as an in-memory NumPy array
+#   memmap     the full matrix in a .npy file on disk, memory-mapped read-only,
+#              so only the pages in use are held in memory
+#   euclidean  EuclideanDistances: computed from the coordinates on demand,
+#              with an LRU cache of recently used rows
+# Solvers index distances NumPy-style, so any backend that supports
+# [i, j], [rows, columns], [i, columns], [rows, j] and [rows] works with all of
+# them; only the optional Numba kernels need an actual array.
+BACKENDS = ("dense", "memmap", "euclidean")
+
+
+# Distances computed from the coordinates whenever they are read, in O(n)
+# memory. Whole rows (distance_matrix[i]) are kept in an LRU cache of
+# cache_rows rows, and single distances or rows of a cached node are served
+# from it.
+class EuclideanDistances:
+    def __init__(
+        self,
+        node_coords,
+        rounded=False,
+        dtype=np.float64,
+        edge_weight_type="EUC_2D",
+        cache_rows=256,
+    ):
+        coords = np.asarray(node_coords, dtype=np.float64)
+        self.x = coords[:, 1].copy()
+        self.y = coords[:, 2].copy()
+        self.rounded = rounded
+        self.dtype = np.dtype(dtype)
+        self.edge_weight_type = edge_weight_type
+        self.shape = (len(coords), len(coords))
+        self.cache_rows = cache_rows
+        self.cache = OrderedDict()
+
+    def __len__(self):
+        return self.shape[0]
+
+    def distance(self, rows, columns):
+        return euclidean_distance(
+            self.x[rows] - self.x[columns],
+            self.y[rows] - self.y[columns],
+            self.rounded,
+            self.dtype,
+            self.edge_weight_type,
+        )
+
+    def row(self, node):
+        node = int(node)
+        row = self.cache.get(node)
+        if row is None:
+            row = self.distance(node, slice(None))
+            self.cache[node] = row
+            if len(self.cache) > self.cache_rows:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(node)
+        return row
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            if np.ndim(key) == 0:
+                return self.row(key)
+            # Blocks of rows are computed without caching them
+            return self.distance(np.asarray(key)[:, None], slice(None))
+
+        rows, columns = key
+        if np.ndim(rows) == 0:
+            row = self.cache.get(int(rows))
+            if row is not None:
+                return row[columns]
+            if isinstance(columns, slice):
+                return self.row(rows)[columns]
+        return self.distance(rows, columns)
+
+
+# Writes the distance matrix of node_coords to a .npy file block_size rows at a
+# time, so the full matrix is never in memory, and maps it read-only
+def create_memmap_matrix(
+    node_coords,
+    path,
+    rounded=False,
+    dtype=np.float64,
+    edge_weight_type="EUC_2D",
+    block_size=1024,
+):
+    coords = np.asarray(node_coords, dtype=np.float64)
+    n = len(coords)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    matrix = np.lib.format.open_memmap(
+        temporary_path, mode="w+", dtype=dtype, shape=(n, n)
+    )
+    for start in range(0, n, block_size):
+        end = min(start + block_size, n)
+        matrix[start:end] = euclidean_distance(
+            coords[start:end, 1, None] - coords[None, :, 1],
+            coords[start:end, 2, None] - coords[None, :, 2],
+            rounded,
+            dtype,
+            edge_weight_type,
+        )
+    matrix.flush()
+    del matrix
+    os.replace(temporary_path, path)
+    return map_matrix(path)
+
+
+# New file name for a memmap matrix in the system's temporary directory. The
+# file is removed when the process that asked for it exits.
+def temporary_matrix_path():
+    path = os.path.join(
+        tempfile.gettempdir(), f"distances-{os.getpid()}-{os.urandom(8).hex()}.npy"
+    )
+    atexit.register(remove_file, path)
+    return path
+
+
+def remove_file(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+# Read-only mapping of a .npy matrix file, as a plain ndarray view: indexing an
+# np.memmap is several times slower, and the file stays mapped either way
+def map_matrix(path):
+    return np.load(path, mmap_mode="r").view(np.ndarray)
+
+
+# Distance provider of the given backend for an instance with coordinates.
+# path is the .npy file of the memmap backend: an existing file is mapped as
+# is, otherwise it is written first.
+def create_distances(
+    backend,
+    node_coords,
+    rounded=False,
+    dtype=np.float64,
+    edge_weight_type="EUC_2D",
+    path=None,
+):
+    if backend == "dense":
+        return calculate_distance_matrix(node_coords, rounded, dtype, edge_weight_type)
+    if backend == "memmap":
+        if os.path.exists(path):
+            return map_matrix(path)
+        return create_memmap_matrix(node_coords, path, rounded, dtype, edge_weight_type)
+    if backend == "euclidean":
+        return EuclideanDistances(node_coords, rounded, dtype, edge_weight_type)
+    raise ValueError(f"Unknown distance backend: {backend}")
@@ -0,0 +1,246 @@
+from utils import calculate_fitness
+
+
+# Change in route distance from exchanging the customers at positions i and j
+def swap_distance_delta(distance_matrix, route, i, j):
+    if i > j:
+        i, j = j, i
+    x, y = route[i] - 1, route[j] - 1
+    prev_i, next_j = route[i - 1] - 1, route[j + 1] - 1
+
+    if j == i + 1:
+        removed = (
+            distance_matrix[prev_i, x]
+            + distance_matrix[x, y]
+            + distance_matrix[y, next_j]
+        )
+        added = (
+            distance_matrix[prev_i, y]
+            + distance_matrix[y, x]
+            + distance_matrix[x, next_j]
+        )
+    else:
+        next_i, prev_j = route[i + 1] - 1, route[j - 1] - 1
+        removed = (
+            distance_matrix[prev_i, x]
+            + distance_matrix[x, next_i]
+            + distance_matrix[prev_j, y]
+            + distance_matrix[y, next_j]
+        )
+        added = (
+            distance_matrix[prev_i, y]
+            + distance_matrix[y, next_i]
+            + distance_matrix[prev_j, x]
+            + distance_matrix[x, next_j]
+        )
+
+    # A Python float, so that costs accumulated from deltas stay plain floats
+    return float(added - removed)
+
+
+# Per-route distance and load cache for a solution, used to evaluate local moves
+# in O(1) instead of re-summing every route. All *_delta methods return the
+# change in fitness (alpha * distance + beta * vehicles) the move would cause;
+# the matching apply_* methods perform the move in place and keep the cache
+# up to date. Positions index into the routes, which start and end at the depot.
+# distance_rows is the matrix as nested lists (see LocalSearch), which is much
+# faster than the array for looking up single distances.
+class RouteCache:
+    def __init__(
+        self,
+        solution,
+        distance_matrix,
+        demands,
+        alpha=1.0,
+        beta=100.0,
+        distance_rows=None,
+    ):
+        self.routes = solution
+        self.distance_matrix = distance_matrix
+        self.distance_rows = distance_rows
+        self.demands = demands
+        self.alpha = alpha
+        self.beta = beta
+        self.distances = [self.route_distance(route) for route in solution]
+        self.loads = [self.route_load(route) for route in solution]
+        self.total_distance = sum(self.distances)
+
+    def dist(self, node1, node2):
+        if self.distance_rows is not None:
+            return self.distance_rows[node1 - 1][node2 - 1]
+        return self.distance_matrix[node1 - 1, node2 - 1]
+
+    def demand(self, node):
+        return self.demands[node - 1][1]
+
+    def route_distance(self, route):
+        return calculate_fitness([route], self.distance_matrix)[1]
+
+    def route_load(self, route):
+        return sum(self.demand(node) for node in route[1:-1])
+
+    def fitness(self):
+        total_distance = float(self.total_distance)
+        number_of_vehicles = len(self.routes)
+        fitness = self.alpha * total_distance + self.beta * number_of_vehicles
+        return fitness, total_distance, number_of_vehicles
+
+    # Replace a whole route (e.g. after a multi-route move) and refresh its
+    # cached distance and load in O(route length)
+    def replace_route(self, route_idx, route):
+        distance = self.route_distance(route)
+        self.total_distance += distance - self.distances[route_idx]
+        self.routes[route_idx] = route
+        self.distances[route_idx] = distance
+        self.loads[route_idx] = self.route_load(route)
+
+    def remove_empty_routes(self):
+        for route_idx in reversed(range(len(self.routes))):
+            if len(self.routes[route_idx]) == 2:
+                self.total_distance -= self.distances[route_idx]
+                del self.routes[route_idx]
+                del self.distances[route_idx]
+                del self.loads[route_idx]
+
+    # Exchange the customers at positions i and j of the same route
+    def swap_delta(self, route_idx, i, j):
+        return self.alpha * self.swap_distance_delta(route_idx, i, j)
+
+    def swap_distance_delta(self, route_idx, i, j):
+        return swap_distance_delta(self.distance_matrix, self.routes[route_idx], i, j)
+
+    def apply_swap(self, route_idx, i, j):
+        delta = self.swap_distance_delta(route_idx, i, j)
+        route = self.routes[route_idx]
+        route[i], route[j] = route[j], route[i]
+        self.distances[route_idx] += delta
+        self.total_distance += delta
+
+    # Reverse the segment route[i..j] (assumes a symmetric distance matrix)
+    def two_opt_delta(self, route_idx, i, j):
+        return self.alpha * self.two_opt_distance_delta(route_idx, i, j)
+
+    def two_opt_distance_delta(self, route_idx, i, j):
+        if i > j:
+            i, j = j, i
+        route = self.routes[route_idx]
+        removed = self.dist(route[i - 1], route[i]) + self.dist(route[j], route[j + 1])
+        added = self.dist(route[i - 1], route[j]) + self.dist(route[i], route[j + 1])
+        return added - removed
+
+    def apply_two_opt(self, route_idx, i, j):
+        if i > j:
+            i, j = j, i
+        delta = self.two_opt_distance_delta(route_idx, i, j)
+        route = self.routes[route_idx]
+        route[i : j + 1] = route[i : j + 1][::-1]
+        self.distances[route_idx] += delta
+        self.total_distance += delta
+
+    # Move the customer at position i of one route in front of position j of
+    # another route. Emptying the source route saves a vehicle.
+    def relocate_delta(self, from_idx, i, to_idx, j):
+        source = self.routes[from_idx]
+        target = self.routes[to_idx]
+        x = source[i]
+        prev_i, next_i = source[i - 1], source[i + 1]
+        prev_j, next_j = target[j - 1], target[j]
+
+        distance_delta = (
+            self.dist(prev_i, next_i)
+            - self.dist(prev_i, x)
+            - self.dist(x, next_i)
+            + self.dist(prev_j, x)
+            + self.dist(x, next_j)
+            - self.dist(prev_j, next_j)
+        )
+        vehicle_delta = -1 if len(source) == 3 else 0
+        return self.alpha * distance_delta + self.beta * vehicle_delta
+
+    def relocate_feasible(self, from_idx, i, to_idx, capacity):
+        node = self.routes[from_idx][i]
+        return self.loads[to_idx] + self.demand(node) <= capacity
+
+    def apply_relocate(self, from_idx, i, to_idx, j):
+        source = self.routes[from_idx]
+        target = self.routes[to_idx]
+        x = source[i]
+        prev_i, next_i = source[i - 1], source[i + 1]
+        prev_j, next_j = target[j - 1], target[j]
+
+        source_delta = (
+            self.dist(prev_i, next_i) - self.dist(prev_i, x) - self.dist(x, next_i)
+        )
+        target_delta = (
+            self.dist(prev_j, x) + self.dist(x, next_j) - self.dist(prev_j, next_j)
+        )
+
+        del source[i]
+        target.insert(j, x)
+        self.distances[from_idx] += source_delta
+        self.distances[to_idx] += target_delta
+        self.loads[from_idx] -= self.demand(x)
+        self.loads[to_idx] += self.demand(x)
+        self.total_distance += source_delta + target_delta
+
+        if len(source) == 2:
+            self.total_distance -= self.distances[from_idx]
+            del self.routes[from_idx]
+            del self.distances[from_idx]
+            del self.loads[from_idx]
+
+    # Exchange the customer at position i of one route with the customer at
+    # position j of another route
+    def inter_swap_delta(self, idx1, i, idx2, j):
+        route1 = self.routes[idx1]
+        route2 = self.routes[idx2]
+        x, y = route1[i], route2[j]
+        prev1, next1 = route1[i - 1], route1[i + 1]
+        prev2, next2 = route2[j - 1], route2[j + 1]
+
+        distance_delta = (
+            self.dist(prev1, y)
+            + self.dist(y, next1)
+            - self.dist(prev1, x)
+            - self.dist(x, next1)
+            + self.dist(prev2, x)
+            + self.dist(x, next2)
+            - self.dist(prev2, y)
+            - self.dist(y, next2)
+        )
+        return self.alpha * distance_delta
+
+    def inter_swap_feasible(self, idx1, i, idx2, j, capacity):
+        x_demand = self.demand(self.routes[idx1][i])
+        y_demand = self.demand(self.routes[idx2][j])
+        return (
+            self.loads[idx1] - x_demand + y_demand <= capacity
+            and self.loads[idx2] - y_demand + x_demand <= capacity
+        )
+
+    def apply_inter_swap(self, idx1, i, idx2, j):
+        route1 = self.routes[idx1]
+        route2 = self.routes[idx2]
+        x, y = route1[i], route2[j]
+        prev1, next1 = route1[i - 1], route1[i + 1]
+        prev2, next2 = route2[j - 1], route2[j + 1]
+
+        delta1 = (
+            self.dist(prev1, y)
+            + self.dist(y, next1)
+            - self.dist(prev1, x)
+            - self.dist(x, next1)
+        )
+        delta2 = (
+            self.dist(prev2, x)
+            + self.dist(x, next2)
+            - self.dist(prev2, y)
+            - self.dist(y, next2)
+        )
+
+        route1[i], route2[j] = y, x
+        self.distances[idx1] += delta1
+        self.distances[idx2] += delta2
+        self.loads[idx1] += self.demand(y) - self.demand(x)
+        self.loads[idx2] += self.demand(x) - self.demand(y)
+        self.total_distance += delta1 + delta2
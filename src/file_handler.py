@@ -1,54 +1,214 @@
 import csv
+import hashlib
 import os
+import re
+import numpy as np
+from instance import Instance
 
 
-def read_file(file_path):
+# Optimal or best known total distance stated in a COMMENT line, such as
+# "(Augerat et al, No of trucks: 5, Optimal value: 784)"
+def parse_best_known(comment):
+    match = re.search(r"(?:Optimal|Best) value:\s*([0-9.]+)", comment, re.IGNORECASE)
+    return float(match.group(1)) if match else None
+
+
+# The (row, column) indices the weights of a triangular EDGE_WEIGHT_FORMAT
+# fill, in the order they are listed. The triangle is mirrored into a
+# symmetric matrix, so column-wise formats, which list the transposed
+# triangle, give the same matrix. FULL_MATRIX is read as written instead.
+def edge_weight_indices(edge_weight_format, dimension):
+    if edge_weight_format in ("LOWER_ROW", "UPPER_COL"):
+        return np.tril_indices(dimension, -1)
+    if edge_weight_format in ("UPPER_ROW", "LOWER_COL"):
+        return np.triu_indices(dimension, 1)
+    if edge_weight_format in ("LOWER_DIAG_ROW", "UPPER_DIAG_COL"):
+        return np.tril_indices(dimension)
+    if edge_weight_format in ("UPPER_DIAG_ROW", "LOWER_DIAG_COL"):
+        return np.triu_indices(dimension)
+    raise ValueError(f"Unsupported EDGE_WEIGHT_FORMAT: {edge_weight_format}")
+
+
+# Reads count numbers from the following lines of file, one line at a time, so
+# no more than one line of text is held in memory
+def read_numbers(file, count):
+    parts = []
+    total = 0
+    while total < count:
+        values = np.array(next(file).split(), dtype=np.float64)
+        parts.append(values)
+        total += len(values)
+    return np.concatenate(parts)[:count]
+
+
+# Streaming TSPLIB / CVRPLIB parser: header keywords are read line by line and
+# each data section is parsed straight into a NumPy array. Supports
+# EDGE_WEIGHT_TYPE EUC_2D, CEIL_2D and EXPLICIT (FULL_MATRIX and every format of
+# edge_weight_indices) with integer or float coordinates. distances selects
+# the distance backend of coordinate instances (see distance.BACKENDS).
+def parse_file(file_path, rounded=False, dtype=np.float64, distances="dense"):
     with open(file_path, "r") as file:
-        lines = file.readlines()
-
-    node_coords_section = False
-    demand_section = False
-    depot_section = False
-    dimension = 0
-    capacity = 0
-    node_coords = []
-    demands = []
+        return parse_lines(file, rounded, dtype, distances)
+
+
+# Same as parse_file for instance file contents given as a string
+def parse_text(text, rounded=False, dtype=np.float64, distances="dense"):
+    return parse_lines(iter(text.splitlines()), rounded, dtype, distances)
+
+
+# Parses an iterator over the lines of an instance file
+def parse_lines(file, rounded=False, dtype=np.float64, distances="dense"):
+    header = {}
+    node_coords = None
+    demands = None
     depot = None
+    weights = None
 
-    for line in lines:
-        line = line.strip()
-        if line.startswith("DIMENSION"):
-            dimension = int(line.split()[-1])
-        elif line.startswith("CAPACITY"):
-            capacity = int(line.split()[-1])
-        elif line.startswith("NODE_COORD_SECTION"):
-            node_coords_section = True
-        elif line.startswith("DEMAND_SECTION"):
-            node_coords_section = False
-            demand_section = True
-        elif line.startswith("DEPOT_SECTION"):
-            demand_section = False
-            depot_section = True
-        elif node_coords_section:
-            parts = line.split()
-            node_coords.append((int(parts[0]), int(parts[1]), int(parts[2])))
-        elif demand_section:
-            parts = line.split()
-            demands.append((int(parts[0]), int(parts[1])))
-        elif depot_section:
-            parts = line.split()
-            if int(parts[0]) == -1:
-                depot_section = False
+    for line in file:
+        key, _, value = line.partition(":")
+        key = key.strip().upper()
+        if not key:
+            continue
+
+        dimension = int(header.get("DIMENSION", 0))
+        if key == "EOF":
+            break
+        elif key == "NODE_COORD_SECTION":
+            node_coords = read_numbers(file, 3 * dimension).reshape(dimension, 3)
+        elif key == "DISPLAY_DATA_SECTION":
+            display_coords = read_numbers(file, 3 * dimension)
+            if node_coords is None:
+                node_coords = display_coords.reshape(dimension, 3)
+        elif key == "DEMAND_SECTION":
+            demands = read_numbers(file, 2 * dimension).reshape(dimension, 2)
+        elif key == "DEPOT_SECTION":
+            depots = []
+            for depot_line in file:
+                if not depot_line.strip():
+                    continue
+                node = int(depot_line.split()[0])
+                if node == -1:
+                    break
+                depots.append(node)
+            depot = depots[0]
+        elif key == "EDGE_WEIGHT_SECTION":
+            edge_weight_format = header.get("EDGE_WEIGHT_FORMAT", "FULL_MATRIX")
+            if edge_weight_format == "FULL_MATRIX":
+                weights = read_numbers(file, dimension**2).reshape(dimension, dimension)
             else:
-                depot = int(parts[0])
-
-    return {
-        "dimension": dimension,
-        "capacity": capacity,
-        "node_coords": node_coords,
-        "demands": demands,
-        "depot": depot,
+                rows, columns = edge_weight_indices(edge_weight_format, dimension)
+                weights = np.zeros((dimension, dimension))
+                weights[rows, columns] = read_numbers(file, len(rows))
+                weights[columns, rows] = weights[rows, columns]
+        else:
+            header[key] = value.strip()
+
+    edge_weight_type = header.get("EDGE_WEIGHT_TYPE", "EUC_2D")
+    if edge_weight_type not in ("EUC_2D", "CEIL_2D", "EXPLICIT"):
+        raise ValueError(f"Unsupported EDGE_WEIGHT_TYPE: {edge_weight_type}")
+
+    return Instance(
+        int(header["DIMENSION"]),
+        int(header["CAPACITY"]),
+        node_coords,
+        [(int(node), int(demand)) for node, demand in demands.tolist()],
+        depot,
+        rounded=rounded,
+        dtype=dtype,
+        name=header.get("NAME"),
+        best_known=parse_best_known(header.get("COMMENT", "")),
+        edge_weight_type=edge_weight_type,
+        distance_matrix=None if weights is None else weights.astype(dtype),
+        distances=distances,
+    )
+
+
+def file_digest(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Writes through a temporary file so that readers never see a partial file
+def atomic_save(path, save, *args, **kwargs):
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as file:
+        save(file, *args, **kwargs)
+    os.replace(temporary_path, path)
+
+
+def save_instance(path, instance):
+    arrays = {
+        "dimension": instance.dimension,
+        "capacity": instance.capacity,
+        "depot": instance.depot,
+        "demands": np.array(instance.demands, dtype=np.int64),
+        "name": instance.name or "",
+        "best_known": np.nan if instance.best_known is None else instance.best_known,
+        "edge_weight_type": instance.edge_weight_type,
     }
+    if instance.node_coords is not None:
+        arrays["node_coords"] = instance.node_coords
+    atomic_save(path, np.savez, **arrays)
+
+
+def load_instance(path, rounded, dtype, distances="dense"):
+    with np.load(path) as data:
+        best_known = float(data["best_known"])
+        return Instance(
+            int(data["dimension"]),
+            int(data["capacity"]),
+            data["node_coords"] if "node_coords" in data else None,
+            [tuple(row) for row in data["demands"].tolist()],
+            int(data["depot"]),
+            rounded=rounded,
+            dtype=dtype,
+            name=str(data["name"]) or None,
+            best_known=None if np.isnan(best_known) else best_known,
+            edge_weight_type=str(data["edge_weight_type"]),
+            distances=distances,
+        )
+
+
+# Reads an instance file. With a cache_dir, the parsed instance is stored there
+# as <sha256 of the file>.npz and its distance matrix as a .npy file per
+# rounding and dtype. Later reads of the same file content skip parsing and
+# distance computation, and the matrix is memory-mapped (read-only) rather
+# than loaded, so processes reading the same instance share its pages. With
+# distances="euclidean" no matrix is stored for coordinate instances.
+def read_file(
+    file_path, rounded=False, dtype=np.float64, cache_dir=None, distances="dense"
+):
+    if cache_dir is None:
+        return parse_file(file_path, rounded, dtype, distances)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    digest = file_digest(file_path)
+    instance_path = os.path.join(cache_dir, f"{digest}.npz")
+    matrix_path = os.path.join(
+        cache_dir,
+        f"{digest}_{'rounded' if rounded else 'exact'}_{np.dtype(dtype).name}.npy",
+    )
+
+    instance = None
+    if os.path.exists(instance_path):
+        instance = load_instance(instance_path, rounded, dtype, distances)
+        # Explicit edge weights are only stored in the matrix file
+        if instance.edge_weight_type == "EXPLICIT" and not os.path.exists(matrix_path):
+            instance = None
+    if instance is None:
+        instance = parse_file(file_path, rounded, dtype, distances)
+        save_instance(instance_path, instance)
+        if instance.edge_weight_type == "EXPLICIT":
+            atomic_save(matrix_path, np.save, instance.distance_matrix)
+
+    # The memmap backend maps the matrix file, writing it first if needed
+    if distances != "euclidean" or instance.edge_weight_type == "EXPLICIT":
+        instance.distances = "memmap"
+        instance.distance_path = matrix_path
+    return instance
 
 
 def log_results(results_dir, file_name, algo_name, best, worst=None, avg=None):
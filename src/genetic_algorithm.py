@@ -1,159 +1,667 @@
-import random
-from utils import calculate_distance_matrix, calculate_fitness
+import os
+from collections import deque
+import numpy as np
+from utils import calculate_fitness, calculate_fitness_batch, make_rng
 from random_search import RandomSearch
 from greedy_search import GreedySearch
-from file_handler import read_file
+from giant_tour import GiantTour
+from local_search import LocalSearch
+from incremental import IncrementalSearch
+from instrumentation import null_section
+from checkpoint import (
+    decode_population,
+    encode_population,
+    encode_random,
+    load_checkpoint,
+    restore_random,
+    save_checkpoint,
+)
+
+
+# Ordered crossover (OX) on customer orders: the child keeps parent1[start:end]
+# in place and fills the remaining positions, left to right, with the other
+# customers in the order they appear in parent2. A membership mask keeps it O(n).
+def order_crossover(parent1, parent2, start, end):
+    segment = parent1[start:end]
+    taken = np.zeros(max(parent1.max(), parent2.max()) + 1, dtype=bool)
+    taken[segment] = True
+    fill = parent2[~taken[parent2]]
+
+    child = np.empty_like(parent1)
+    child[:start] = fill[:start]
+    child[start:end] = segment
+    child[end:] = fill[start:]
+    return child
+
+
+# OX for a batch of parent pairs given as rows of two 2D arrays
+def order_crossover_batch(parents1, parents2, starts, ends):
+    count, length = parents1.shape
+    rows = np.arange(count)[:, None]
+    positions = np.arange(length)[None, :]
+    in_segment = (positions >= starts[:, None]) & (positions < ends[:, None])
+
+    taken = np.zeros((count, max(parents1.max(), parents2.max()) + 1), dtype=bool)
+    taken[rows, parents1] = in_segment
+    keep = ~taken[rows, parents2]
+
+    # Every row keeps exactly as many parent2 customers as it has free
+    # positions, so the row-major selections line up
+    children = parents1.copy()
+    children[~in_segment] = parents2[keep]
+    return children
+
+
+# Hybrid mode settings (see GeneticAlgorithm.run(hybrid=True)): share of
+# feasible offspring the capacity penalty aims for, offspring between penalty
+# updates, survivors kept by cost alone, and the number of closest
+# individuals a diversity contribution is averaged over
+TARGET_FEASIBLE = 0.2
+PENALTY_INTERVAL = 100
+ELITE_COUNT = 4
+CLOSEST_COUNT = 5
+
+
+# Successor and predecessor of every customer (0 next to the depot), indexed
+# by node, for the broken-pairs distance
+def adjacency(individual, size):
+    tour = individual.tour
+    successors = np.zeros(size, dtype=np.int32)
+    predecessors = np.zeros(size, dtype=np.int32)
+    successors[tour[:-1]] = tour[1:]
+    predecessors[tour[1:]] = tour[:-1]
+    successors[tour[individual.starts[1:] - 1]] = 0
+    predecessors[tour[individual.starts[:-1]]] = 0
+    return successors, predecessors
+
+
+# Broken-pairs distances from every individual to every other: the share of
+# customers whose neighbors differ between the two solutions
+def broken_pairs_distances(population, size, customer_count):
+    successors, predecessors = zip(
+        *(adjacency(individual, size) for individual in population)
+    )
+    successors = np.stack(successors)
+    predecessors = np.stack(predecessors)
+
+    distances = np.empty((len(population), len(population)))
+    for idx in range(len(population)):
+        broken = (successors[idx] != successors) & (successors[idx] != predecessors)
+        broken |= (predecessors[idx] == 0) & (predecessors != 0) & (successors != 0)
+        distances[idx] = broken.sum(axis=1) / customer_count
+    return distances
 
 
 class GeneticAlgorithm:
-    def __init__(self, dimension, capacity, node_coords, demands, depot):
-        self.dimension = dimension
-        self.capacity = capacity
-        self.node_coords = node_coords
-        self.demands = demands
-        self.depot = depot
-        self.distance_matrix = calculate_distance_matrix(self.node_coords)
-        self.random_search = RandomSearch(
-            dimension, capacity, node_coords, demands, depot
-        )
-        self.greedy_search = GreedySearch(
-            dimension, capacity, node_coords, demands, depot
-        )
+    # seed: int, None or a random.Random to draw from (see utils.make_rng)
+    def __init__(self, instance, seed=None):
+        self.instance = instance
+        self.dimension = instance.dimension
+        self.capacity = instance.capacity
+        self.node_coords = instance.node_coords
+        self.demands = instance.demands
+        self.depot = instance.depot
+        self.distance_matrix = instance.distance_matrix
+        self.random = make_rng(seed)
+        self.random_search = RandomSearch(instance, self.random)
+        self.greedy_search = GreedySearch(instance, seed=self.random)
         self.population = None
+        self.evaluations = 0
+        self.split_cache = None
+        self.split_cache_size = 10000
+        self.local_search = None
+        self.repairer = None
+        self.hybrid = False
+        self.education_moves = None
+        self.penalty = 0.0
+        self.feasibility = deque(maxlen=PENALTY_INTERVAL)
+        self.offspring_count = 0
+        self.profiler = None
+        self.section = null_section
 
-    def generate_initial_population(self, population_size=100):
-        population = []
-        greedy_population_size = int(population_size * 0.8)
-        random_population_size = population_size - greedy_population_size
+    # initial_population: solutions (lists of routes, e.g. the previous plan)
+    # that make up the first individuals; the rest is generated as usual
+    def generate_initial_population(self, population_size=100, initial_population=None):
+        population = [
+            GiantTour.from_routes(solution, self.instance)
+            for solution in (initial_population or [])[:population_size]
+        ]
+        remaining = population_size - len(population)
+        greedy_population_size = int(remaining * 0.8)
+        random_population_size = remaining - greedy_population_size
 
         for _ in range(greedy_population_size):
-            population.append(self.greedy_search.generate_randomized_greedy_solution())
+            solution = self.greedy_search.generate_randomized_greedy_solution()
+            population.append(GiantTour.from_routes(solution, self.instance))
 
         for _ in range(random_population_size):
-            population.append(self.random_search.generate_random_solution())
+            solution = self.random_search.generate_random_solution()
+            population.append(GiantTour.from_routes(solution, self.instance))
 
         return population
 
     def calculate_fitness_population(self, population):
-        return [
-            (individual, calculate_fitness(individual, self.distance_matrix))
-            for individual in population
-        ]
+        self.evaluations += len(population)
+        fitness, total_distance, number_of_vehicles, _ = calculate_fitness_batch(
+            *GiantTour.flatten_population(population, self.depot),
+            self.distance_matrix,
+            self.instance.demand_array,
+            self.capacity,
+        )
+        return list(
+            zip(
+                population,
+                zip(
+                    fitness.tolist(),
+                    total_distance.tolist(),
+                    number_of_vehicles.tolist(),
+                ),
+            )
+        )
 
     def tournament_selection(self, population_fitness, tournament_size=5):
-        tournament = random.sample(population_fitness, tournament_size)
+        tournament = self.random.sample(
+            population_fitness, min(tournament_size, len(population_fitness))
+        )
         tournament.sort(key=lambda x: x[1][0])
         return tournament[0][0]
 
-    def get_flattened_solution(self, solution):
-        return [node for route in solution for node in route if node != self.depot]
-
     def crossover_ox(self, parent1, parent2):
-        parent1_flat = self.get_flattened_solution(parent1)
-        parent2_flat = self.get_flattened_solution(parent2)
-
-        crossover_point1 = random.randint(0, len(parent1_flat) - 1)
-        crossover_point2 = random.randint(0, len(parent1_flat) - 1)
+        crossover_point1 = self.random.randint(0, len(parent1.tour) - 1)
+        crossover_point2 = self.random.randint(0, len(parent1.tour) - 1)
 
         if crossover_point1 > crossover_point2:
             crossover_point1, crossover_point2 = crossover_point2, crossover_point1
 
-        child_flat = [-1] * len(parent1_flat)
-        child_flat[crossover_point1:crossover_point2] = parent1_flat[
-            crossover_point1:crossover_point2
-        ]
+        with self.section("crossover"):
+            child_order = order_crossover(
+                parent1.tour, parent2.tour, crossover_point1, crossover_point2
+            )
+
+        # Cut the child's customer order into routes optimally
+        with self.section("evaluation"):
+            return self.split_order(child_order)
+
+    # Same as crossover_ox for a list of parent pairs, with all children's
+    # orders built in one vectorized step
+    def crossover_ox_batch(self, parents1, parents2):
+        length = len(parents1[0].tour)
+        crossover_points = np.array(
+            [
+                sorted(
+                    (
+                        self.random.randint(0, length - 1),
+                        self.random.randint(0, length - 1),
+                    )
+                )
+                for _ in parents1
+            ]
+        ).reshape(-1, 2)
+
+        with self.section("crossover", len(parents1)):
+            child_orders = order_crossover_batch(
+                np.stack([parent.tour for parent in parents1]),
+                np.stack([parent.tour for parent in parents2]),
+                crossover_points[:, 0],
+                crossover_points[:, 1],
+            )
+
+        with self.section("evaluation", len(parents1)):
+            return [self.split_order(child_order) for child_order in child_orders]
+
+    # Splits a customer order into routes. With deduplication on, orders that
+    # were already split reuse the cached result instead of being re-evaluated.
+    def split_order(self, order):
+        if self.split_cache is None:
+            self.evaluations += 1
+            return GiantTour.split(order, self.instance, penalty=self.penalty)
+
+        key = order.tobytes()
+        individual = self.split_cache.get(key)
+        if individual is None:
+            self.evaluations += 1
+            individual = GiantTour.split(order, self.instance, penalty=self.penalty)
+            if len(self.split_cache) >= self.split_cache_size:
+                # Evict the oldest entry
+                del self.split_cache[next(iter(self.split_cache))]
+            self.split_cache[key] = individual
+        return individual.copy()
+
+    # Selection and crossover for one generation. With batch_crossover, the
+    # children of all crossover pairs are built together by crossover_ox_batch.
+    def create_offspring(
+        self,
+        population_fitness,
+        count,
+        crossover_rate,
+        tournament_size,
+        batch_crossover=False,
+    ):
+        offspring = []
+        crossover_pairs = []
+
+        for _ in range(count):
+            # Selection
+            with self.section("selection", 2):
+                parent1 = self.tournament_selection(population_fitness, tournament_size)
+                parent2 = self.tournament_selection(population_fitness, tournament_size)
 
-        p2_index = 0
-        for i in range(len(child_flat)):
-            if child_flat[i] == -1:
-                while parent2_flat[p2_index] in child_flat:
-                    p2_index += 1
-                child_flat[i] = parent2_flat[p2_index]
-
-        child = []
-        current_route = [self.depot]
-        current_demand = 0
-        for node in child_flat:
-            node_demand = self.demands[node - 1][1]
-            if current_demand + node_demand <= self.capacity:
-                current_route.append(node)
-                current_demand += node_demand
+            # Crossover
+            if self.random.random() < crossover_rate:
+                if batch_crossover:
+                    crossover_pairs.append((parent1, parent2))
+                else:
+                    offspring.append(self.crossover_ox(parent1, parent2))
             else:
-                current_route.append(self.depot)
-                child.append(current_route)
-                current_route = [self.depot, node]
-                current_demand = node_demand
-        current_route.append(self.depot)
-        child.append(current_route)
+                # Copy so that mutation does not alter the surviving parent
+                offspring.append(self.random.choice([parent1, parent2]).copy())
 
-        return child
+        if crossover_pairs:
+            parents1, parents2 = zip(*crossover_pairs)
+            offspring.extend(self.crossover_ox_batch(parents1, parents2))
 
+        return offspring
+
+    # Returns the mutated individual together with its fitness, which is kept
+    # up to date with O(1) delta evaluation of each swap
     def swap_mutation(self, individual, mutation_rate=0.05):
-        for route in individual:
-            if len(route) > 3 and random.random() < mutation_rate:
-                idx1, idx2 = random.sample(range(1, len(route) - 1), 2)
-                route[idx1], route[idx2] = route[idx2], route[idx1]
-        return individual
+        for route_idx in range(len(individual.costs)):
+            route_length = (
+                individual.starts[route_idx + 1] - individual.starts[route_idx]
+            )
+            if route_length > 1 and self.random.random() < mutation_rate:
+                idx1, idx2 = self.random.sample(range(1, route_length + 1), 2)
+                individual.swap(route_idx, idx1, idx2, self.distance_matrix, self.depot)
+        return individual, self.penalized_fitness(individual)
 
-    def run(
+    # Fitness plus the capacity penalty of the hybrid mode for the load above
+    # capacity (zero outside hybrid mode, where individuals are feasible)
+    def penalized_fitness(self, individual):
+        fitness, total_distance, number_of_vehicles = individual.fitness()
+        if self.penalty:
+            fitness += self.penalty * individual.excess(self.capacity)
+        return fitness, total_distance, number_of_vehicles
+
+    # Education: improves an offspring with the inter-route moves of
+    # LocalSearch (at most max_moves of them) and re-encodes the result
+    def educate(self, individual, max_moves=None):
+        if self.local_search is None:
+            self.local_search = LocalSearch(self.instance)
+        routes = individual.routes(self.depot)
+        self.local_search.improve(routes, max_moves)
+        self.evaluations += 1
+        individual = GiantTour.from_routes(routes, self.instance)
+        return individual, self.penalized_fitness(individual)
+
+    # Feasible copy of an overloaded individual: the customers whose removal
+    # saves the most distance are taken out of every route above capacity
+    # until it fits, reinserted at their cheapest feasible positions, and the
+    # changed routes are improved (see IncrementalSearch)
+    def repair(self, individual):
+        if self.repairer is None:
+            self.repairer = IncrementalSearch(self.instance)
+        routes = individual.routes(self.depot)
+        removed = []
+        for route, load in zip(routes, individual.loads.tolist()):
+            if load <= self.capacity:
+                continue
+            nodes = np.array(route) - 1
+            savings = (
+                self.distance_matrix[nodes[:-2], nodes[1:-1]]
+                + self.distance_matrix[nodes[1:-1], nodes[2:]]
+                - self.distance_matrix[nodes[:-2], nodes[2:]]
+            )
+            for position in np.argsort(-savings, kind="stable").tolist():
+                if load <= self.capacity:
+                    break
+                removed.append(route[position + 1])
+                load -= self.demands[route[position + 1] - 1][1]
+
+        self.repairer.reoptimize(routes, removed, removed, self.education_moves)
+        self.evaluations += 1
+        individual = GiantTour.from_routes(routes, self.instance)
+        return individual, self.penalized_fitness(individual)
+
+    # Adaptive capacity penalty: every PENALTY_INTERVAL offspring the penalty
+    # grows if fewer than TARGET_FEASIBLE of the recent offspring were
+    # feasible and shrinks if more were
+    def update_penalty(self, feasible):
+        self.feasibility.append(feasible)
+        self.offspring_count += 1
+        if self.offspring_count % PENALTY_INTERVAL:
+            return
+
+        share = sum(self.feasibility) / len(self.feasibility)
+        if share < TARGET_FEASIBLE - 0.05:
+            self.penalty = min(self.penalty * 1.2, 100000.0)
+        elif share > TARGET_FEASIBLE + 0.05:
+            self.penalty = max(self.penalty * 0.85, 0.1)
+        else:
+            return
+        # Cached splits were made with the previous penalty
+        if self.split_cache is not None:
+            self.split_cache.clear()
+
+    # Survivor selection of the hybrid mode. Clones are removed, the
+    # ELITE_COUNT best individuals by cost survive, and the rest are chosen by
+    # biased fitness: the rank by penalized cost plus the rank by diversity
+    # contribution (mean broken-pairs distance to the CLOSEST_COUNT closest
+    # individuals), so that distinct solutions of similar cost are kept. When
+    # fewer distinct individuals are left than population_size, new ones from
+    # generate_initial_population fill the population up. Feasible
+    # individuals come first, so the head is the best feasible one.
+    def select_survivors(self, population_fitness, population_size):
+        unique = {}
+        for individual, _ in population_fitness:
+            key = individual.tour.tobytes() + individual.starts.tobytes()
+            unique.setdefault(key, individual)
+        individuals = list(unique.values())
+        if len(individuals) < population_size:
+            individuals += self.generate_initial_population(
+                population_size - len(individuals)
+            )
+            self.evaluations += population_size - len(unique)
+        candidates = sorted(
+            (
+                (individual, self.penalized_fitness(individual))
+                for individual in individuals
+            ),
+            key=lambda x: (x[0].excess(self.capacity) > 0, x[1][0]),
+        )
+        if len(candidates) == population_size:
+            return candidates
+
+        count = len(candidates)
+        distances = broken_pairs_distances(
+            [individual for individual, _ in candidates],
+            self.dimension + 1,
+            len(candidates[0][0].tour),
+        )
+        np.fill_diagonal(distances, np.inf)
+        closest = min(CLOSEST_COUNT, count - 1)
+        contribution = np.sort(distances, axis=1)[:, :closest].mean(axis=1)
+
+        cost_rank = np.arange(count) / (count - 1)
+        diversity_rank = np.empty(count)
+        diversity_rank[np.argsort(-contribution, kind="stable")] = np.arange(count) / (
+            count - 1
+        )
+        biased_fitness = cost_rank + (1 - ELITE_COUNT / count) * diversity_rank
+
+        elite = min(ELITE_COUNT, population_size)
+        rest = np.argsort(biased_fitness[elite:], kind="stable") + elite
+        chosen = list(range(elite)) + rest[: population_size - elite].tolist()
+        return [candidates[idx] for idx in sorted(chosen)]
+
+    # Evolves population_fitness for the given number of generations (or until
+    # stopping says so) and returns the final population with the worst fitness
+    # seen, the sum and the number of all fitness values and the number of
+    # generations run, for the run statistics. A run evolved in several parts passes on the
+    # generations done so far (for the profiler trace) and its statistics.
+    def evolve(
         self,
-        generations=1000,
+        population_fitness,
+        generations,
         population_size=100,
         crossover_rate=0.8,
         mutation_rate=0.05,
         tournament_size=5,
+        batch_crossover=False,
+        education_rate=0.0,
+        stopping=None,
+        first_generation=0,
+        worst_fitness=float("-inf"),
+        total_fitness_sum=0,
+        fitness_count=0,
     ):
-        self.population = self.generate_initial_population()
-
-        best_fitness = float("inf")
-        worst_fitness = float("-inf")
-        total_fitness_sum = 0
+        completed_generations = 0
 
         for generation in range(generations):
             new_population = []
-            population_fitness = self.calculate_fitness_population(self.population)
-
-            generation_best_fitness = float("inf")
-            generation_worst_fitness = float("-inf")
 
             for individual, fitness in population_fitness:
                 total_fitness_sum += fitness[0]
-                if fitness[0] < generation_best_fitness:
-                    generation_best_fitness = fitness[0]
-                if fitness[0] > generation_worst_fitness:
-                    generation_worst_fitness = fitness[0]
-
-            # Update overall best and worst fitness
-            if generation_best_fitness < best_fitness:
-                best_fitness = generation_best_fitness
-            if generation_worst_fitness > worst_fitness:
-                worst_fitness = generation_worst_fitness
-
-            for _ in range(population_size):
-                # Selection
-                parent1 = self.tournament_selection(population_fitness, tournament_size)
-                parent2 = self.tournament_selection(population_fitness, tournament_size)
+                if fitness[0] > worst_fitness:
+                    worst_fitness = fitness[0]
+            fitness_count += len(population_fitness)
 
-                # Crossover
-                if random.random() < crossover_rate:
-                    child = self.crossover_ox(parent1, parent2)
-                else:
-                    child = random.choice([parent1, parent2])
+            offspring = self.create_offspring(
+                population_fitness,
+                population_size,
+                crossover_rate,
+                tournament_size,
+                batch_crossover,
+            )
+            for child in offspring:
+                # Mutation, then education for a share of the offspring (all
+                # of them in hybrid mode)
+                with self.section("mutation"):
+                    child, fitness = self.swap_mutation(child, mutation_rate)
+                if self.hybrid or self.random.random() < education_rate:
+                    with self.section("education"):
+                        child, fitness = self.educate(child, self.education_moves)
+                new_population.append((child, fitness))
+
+                # Infeasible offspring are kept, and half of the time a
+                # repaired copy joins them
+                if self.hybrid:
+                    feasible = child.excess(self.capacity) == 0
+                    if not feasible and self.random.random() < 0.5:
+                        with self.section("repair"):
+                            new_population.append(self.repair(child))
+                    self.update_penalty(feasible)
+
+            if self.hybrid:
+                with self.section("survivors"):
+                    population_fitness = self.select_survivors(
+                        population_fitness + new_population, population_size
+                    )
+            else:
+                # Elitism
+                population_fitness = sorted(
+                    population_fitness + new_population,
+                    key=lambda x: x[1][0],
+                )[:population_size]
+            self.population = [individual for individual, _ in population_fitness]
+            completed_generations += 1
+
+            if self.profiler is not None:
+                self.profiler.record(
+                    first_generation + generation,
+                    population_fitness[0][1][0],
+                    min(fitness[0] for _, fitness in new_population),
+                    self.evaluations,
+                )
+
+            if stopping is not None:
+                best_individual, best_fitness = population_fitness[0]
+                if stopping.update(
+                    best_fitness[0],
+                    best_individual.routes(self.depot),
+                    self.evaluations - stopping.evaluations,
+                ):
+                    break
+
+        return (
+            population_fitness,
+            worst_fitness,
+            total_fitness_sum,
+            fitness_count,
+            completed_generations,
+        )
+
+    # The state of a run after generation generations: population with
+    # fitness, random generator, evaluation count and run statistics
+    def save_checkpoint(
+        self,
+        path,
+        population_fitness,
+        generation,
+        worst_fitness,
+        total_fitness_sum,
+        fitness_count,
+    ):
+        save_checkpoint(
+            path,
+            "GeneticAlgorithm",
+            self.instance,
+            generation=generation,
+            evaluations=self.evaluations,
+            penalty=self.penalty,
+            feasibility=np.array(self.feasibility, dtype=bool),
+            offspring_count=self.offspring_count,
+            worst_fitness=worst_fitness,
+            total_fitness_sum=total_fitness_sum,
+            fitness_count=fitness_count,
+            **encode_population(population_fitness),
+            **encode_random(self.random),
+        )
+
+    # Restores the state saved by save_checkpoint and returns the population
+    # with the generation and run statistics
+    def load_checkpoint(self, path):
+        state = load_checkpoint(path, "GeneticAlgorithm", self.instance)
+        restore_random(self.random, state)
+        self.evaluations = int(state["evaluations"])
+        self.penalty = float(state["penalty"])
+        self.feasibility.extend(state["feasibility"].tolist())
+        self.offspring_count = int(state["offspring_count"])
+        return (
+            decode_population(state),
+            int(state["generation"]),
+            float(state["worst_fitness"]),
+            float(state["total_fitness_sum"]),
+            int(state["fitness_count"]),
+        )
+
+    # checkpoint: file the run's state is saved to every checkpoint_interval
+    # generations and at the end. resume: continue from that file if it
+    # exists; generations counts the generations of the whole run, so a
+    # resumed run (with the same parameters and seed) ends exactly as the
+    # uninterrupted run would. The deduplication cache is not saved, so only
+    # the evaluation count of a resumed deduplicating run can differ.
+    # hybrid: Hybrid Genetic Search mode. Every offspring is educated (with
+    # at most education_moves local search moves), children may exceed the
+    # capacity under an adaptive penalty, and survivors are selected by
+    # biased fitness (see select_survivors) instead of plain elitism.
+    def run(
+        self,
+        generations=1000,
+        population_size=100,
+        crossover_rate=0.8,
+        mutation_rate=0.05,
+        tournament_size=5,
+        deduplicate=False,
+        batch_crossover=False,
+        education_rate=0.0,
+        stopping=None,
+        profiler=None,
+        initial_population=None,
+        checkpoint=None,
+        checkpoint_interval=10,
+        resume=False,
+        hybrid=False,
+        education_moves=None,
+    ):
+        if stopping is not None:
+            stopping.start()
+        self.profiler = profiler
+        self.section = null_section
+        if profiler is not None:
+            profiler.start()
+            self.section = profiler.section
+
+        self.evaluations = 0
+        self.split_cache = {} if deduplicate else None
+        self.hybrid = hybrid
+        self.education_moves = education_moves
+        self.feasibility.clear()
+        self.offspring_count = 0
+        self.penalty = 0.0
+        if hybrid:
+            # Initial penalty: the longest depot distance per unit of the
+            # largest demand
+            self.penalty = float(
+                np.clip(
+                    self.distance_matrix[self.depot - 1].max()
+                    / max(self.instance.demand_array.max(), 1),
+                    0.1,
+                    1000.0,
+                )
+            )
+
+        completed_generations = 0
+        worst_fitness = float("-inf")
+        total_fitness_sum = 0
+        fitness_count = 0
+
+        if resume and checkpoint is not None and os.path.exists(checkpoint):
+            (
+                population_fitness,
+                completed_generations,
+                worst_fitness,
+                total_fitness_sum,
+                fitness_count,
+            ) = self.load_checkpoint(checkpoint)
+        else:
+            # Every individual is kept together with its fitness, which is
+            # computed once when the individual is created and reused from
+            # then on
+            with self.section("construction", population_size):
+                population = self.generate_initial_population(
+                    population_size, initial_population
+                )
+            with self.section("evaluation", population_size):
+                population_fitness = self.calculate_fitness_population(population)
+        self.population = [individual for individual, _ in population_fitness]
 
-                # Mutation
-                child = self.swap_mutation(child, mutation_rate)
+        # Without a checkpoint the whole run is one epoch
+        while completed_generations < generations:
+            epoch = generations - completed_generations
+            if checkpoint is not None:
+                epoch = min(epoch, checkpoint_interval)
 
-                new_population.append(child)
+            (
+                population_fitness,
+                worst_fitness,
+                total_fitness_sum,
+                fitness_count,
+                epoch_generations,
+            ) = self.evolve(
+                population_fitness,
+                epoch,
+                population_size,
+                crossover_rate,
+                mutation_rate,
+                tournament_size,
+                batch_crossover,
+                education_rate,
+                stopping,
+                completed_generations,
+                worst_fitness,
+                total_fitness_sum,
+                fitness_count,
+            )
+            completed_generations += epoch_generations
 
-            # Elitism
-            self.population = sorted(
-                self.population + new_population,
-                key=lambda x: calculate_fitness(x, self.distance_matrix)[0],
-            )[:population_size]
+            if checkpoint is not None:
+                with self.section("checkpoint"):
+                    self.save_checkpoint(
+                        checkpoint,
+                        population_fitness,
+                        completed_generations,
+                        worst_fitness,
+                        total_fitness_sum,
+                        fitness_count,
+                    )
+            if epoch_generations < epoch or (
+                stopping is not None and stopping.should_stop()
+            ):
+                break
 
-        average_fitness = total_fitness_sum / (generations * population_size)
+        average_fitness = total_fitness_sum / fitness_count
 
-        best_individual = self.population[0]
+        best_individual = self.population[0].routes(self.depot)
         best_fitness, best_total_distance, best_number_of_vehicles = calculate_fitness(
             best_individual, self.distance_matrix
         )
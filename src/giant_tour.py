@@ -0,0 +1,187 @@
+import numpy as np
+import kernels
+from evaluation import swap_distance_delta
+
+
+# Compact solution: every customer in visiting order (without depots) in one
+# int32 array, plus the offset at which each route starts. Route r covers
+# tour[starts[r]:starts[r + 1]]. Per-route loads and distances are cached.
+class GiantTour:
+    __slots__ = ("tour", "starts", "loads", "costs")
+
+    def __init__(self, tour, starts, loads, costs):
+        self.tour = tour
+        self.starts = starts
+        self.loads = loads
+        self.costs = costs
+
+    @classmethod
+    def from_routes(cls, routes, instance):
+        tour = np.fromiter(
+            (node for route in routes for node in route[1:-1]), dtype=np.int32
+        )
+        lengths = [len(route) - 2 for route in routes]
+        starts = np.zeros(len(routes) + 1, dtype=np.int32)
+        np.cumsum(lengths, out=starts[1:])
+        return cls.from_arrays(tour, starts, instance)
+
+    @classmethod
+    def from_arrays(cls, tour, starts, instance):
+        distance_matrix = instance.distance_matrix
+        depot = instance.depot - 1
+        nodes = tour.astype(np.intp) - 1
+        first = starts[:-1]
+        last = starts[1:] - 1
+
+        # Edges between consecutive customers, summed per route; the edge that
+        # crosses from one route to the next is not part of either route
+        edges = distance_matrix[nodes[:-1], nodes[1:]]
+        edge_sums = np.concatenate(([0.0], np.cumsum(edges)))
+        costs = (
+            edge_sums[last]
+            - edge_sums[first]
+            + distance_matrix[depot, nodes[first]]
+            + distance_matrix[nodes[last], depot]
+        )
+
+        load_sums = np.concatenate(([0], np.cumsum(instance.demand_array[nodes])))
+        loads = load_sums[starts[1:]] - load_sums[first]
+
+        return cls(tour, starts, loads, costs)
+
+    # Optimal partition of a customer order into routes (Prins' split): a
+    # shortest path over the order where arc (i, j) is the route serving
+    # order[i:j]. Routes are cut as soon as the capacity is exceeded, so the
+    # work is O(n * B) for routes of at most B customers. With a penalty,
+    # routes may be loaded up to 1.5 times the capacity and pay penalty per
+    # unit of excess load (infeasible individuals of the hybrid GA).
+    @classmethod
+    def split(cls, order, instance, alpha=1.0, beta=100.0, penalty=0.0):
+        distance_matrix = instance.distance_matrix
+        nodes = order.astype(np.intp) - 1
+        depot = instance.depot - 1
+        n = len(order)
+
+        capacity = instance.capacity
+        max_load = capacity + capacity // 2 if penalty else capacity
+        from_depot = distance_matrix[depot, nodes]
+        to_depot = distance_matrix[nodes, depot]
+        between = distance_matrix[nodes[:-1], nodes[1:]]
+        demand = instance.demand_array[nodes]
+
+        if kernels.use_numba:
+            predecessor = kernels.split_predecessors(
+                from_depot,
+                to_depot,
+                between,
+                demand,
+                capacity,
+                alpha,
+                beta,
+                penalty,
+                max_load,
+            )
+        else:
+            predecessor = cls.split_predecessors(
+                from_depot.tolist(),
+                to_depot.tolist(),
+                between.tolist(),
+                demand.tolist(),
+                capacity,
+                alpha,
+                beta,
+                penalty,
+                max_load,
+            )
+
+        cuts = [n]
+        while cuts[-1] > 0:
+            cuts.append(int(predecessor[cuts[-1]]))
+        starts = np.array(cuts[::-1], dtype=np.int32)
+
+        return cls.from_arrays(order.astype(np.int32, copy=False), starts, instance)
+
+    # Population in the flat form of utils.flatten_population, built from the
+    # tour arrays directly by inserting a depot before and after every route
+    @staticmethod
+    def flatten_population(population, depot):
+        parts = []
+        route_starts = []
+        solution_routes = [0]
+        offset = 0
+
+        for individual in population:
+            starts = individual.starts
+            route_count = len(starts) - 1
+            depot_positions = np.stack((starts[:-1], starts[1:]), axis=1).ravel()
+            nodes = np.insert(individual.tour.astype(np.intp), depot_positions, depot)
+
+            parts.append(nodes)
+            route_starts.append(offset + starts[:-1] + 2 * np.arange(route_count))
+            solution_routes.append(solution_routes[-1] + route_count)
+            offset += len(nodes)
+
+        route_starts.append([offset])
+        return (
+            np.concatenate(parts),
+            np.concatenate(route_starts).astype(np.intp),
+            np.array(solution_routes, dtype=np.intp),
+        )
+
+    # Pure-Python version of kernels.split_predecessors
+    @staticmethod
+    def split_predecessors(
+        from_depot, to_depot, between, demand, capacity, alpha, beta, penalty, max_load
+    ):
+        n = len(demand)
+        potential = [0.0] + [float("inf")] * n
+        predecessor = [0] * (n + 1)
+        for i in range(n):
+            load = 0
+            distance = 0.0
+            for j in range(i, n):
+                load += demand[j]
+                if load > max_load and j > i:
+                    break
+                if j == i:
+                    distance = from_depot[j]
+                else:
+                    distance += between[j - 1]
+                cost = potential[i] + alpha * (distance + to_depot[j]) + beta
+                if load > capacity:
+                    cost += penalty * (load - capacity)
+                if cost < potential[j + 1]:
+                    potential[j + 1] = cost
+                    predecessor[j + 1] = i
+        return predecessor
+
+    def copy(self):
+        return GiantTour(
+            self.tour.copy(), self.starts.copy(), self.loads.copy(), self.costs.copy()
+        )
+
+    def route(self, route_idx, depot):
+        start, end = self.starts[route_idx], self.starts[route_idx + 1]
+        return [depot] + self.tour[start:end].tolist() + [depot]
+
+    def routes(self, depot):
+        return [self.route(route_idx, depot) for route_idx in range(len(self.costs))]
+
+    # Exchange the customers at positions i and j (1-based, as in route lists)
+    # of one route and update its cached distance
+    def swap(self, route_idx, i, j, distance_matrix, depot):
+        route = self.route(route_idx, depot)
+        delta = swap_distance_delta(distance_matrix, route, i, j)
+        start = self.starts[route_idx] - 1
+        self.tour[start + i], self.tour[start + j] = route[j], route[i]
+        self.costs[route_idx] += delta
+
+    # Total load above capacity over all routes
+    def excess(self, capacity):
+        return int(np.maximum(self.loads - capacity, 0).sum())
+
+    def fitness(self, alpha=1.0, beta=100.0):
+        total_distance = float(self.costs.sum())
+        number_of_vehicles = len(self.costs)
+        fitness = alpha * total_distance + beta * number_of_vehicles
+        return fitness, total_distance, number_of_vehicles
@@ -1,19 +1,45 @@
-import random
-from utils import calculate_distance_matrix, calculate_fitness
+import numpy as np
+from utils import calculate_fitness, CustomerSet, make_rng
+from local_search import LocalSearch
+from instrumentation import null_section
 
 
 class GreedySearch:
-    def __init__(self, dimension, capacity, node_coords, demands, depot):
-        self.dimension = dimension
-        self.capacity = capacity
-        self.node_coords = node_coords
-        self.demands = demands
-        self.depot = depot
-        self.distance_matrix = calculate_distance_matrix(self.node_coords)
+    # neighbor_count: size of the k-nearest neighbor lists that are searched
+    # before falling back to a scan of all remaining customers.
+    # seed: int, None or a random.Random to draw from (see utils.make_rng)
+    def __init__(self, instance, neighbor_count=20, seed=None):
+        self.instance = instance
+        self.dimension = instance.dimension
+        self.capacity = instance.capacity
+        self.node_coords = instance.node_coords
+        self.demands = instance.demands
+        self.depot = instance.depot
+        self.distance_matrix = instance.distance_matrix
+        self.neighbors = instance.nearest_neighbors(neighbor_count)
+        self.random = make_rng(seed)
+
+    # Up to k remaining customers that fit into the vehicle, nearest to
+    # last_customer first. Neighbor lists are sorted by distance and every node
+    # missing from a list is farther away than the whole list, so the first
+    # feasible entries are the nearest feasible customers overall.
+    def nearest_candidates(self, last_customer, remaining_customers, current_load, k):
+        candidates = []
+        position = remaining_customers.position
+        for customer in self.neighbors[last_customer - 1]:
+            if (
+                position[customer] >= 0
+                and current_load + self.demands[customer - 1][1] <= self.capacity
+            ):
+                candidates.append(customer)
+                if len(candidates) == k:
+                    break
+        return candidates
 
     def generate_greedy_solution(self):
-        remaining_customers = list(range(1, self.dimension + 1))
-        remaining_customers.remove(self.depot)
+        remaining_customers = CustomerSet(
+            self.instance.customers, self.instance.demand_array
+        )
 
         routes = []
         while remaining_customers:
@@ -23,15 +49,21 @@ class GreedySearch:
             while remaining_customers:
                 last_customer = current_route[-1]
                 nearest_customer = None
-                nearest_distance = float("inf")
 
-                for customer in remaining_customers:
-                    demand = self.demands[customer - 1][1]
-                    if current_load + demand <= self.capacity:
-                        distance = self.distance_matrix[last_customer - 1][customer - 1]
-                        if distance < nearest_distance:
-                            nearest_distance = distance
-                            nearest_customer = customer
+                candidates = self.nearest_candidates(
+                    last_customer, remaining_customers, current_load, 1
+                )
+                if candidates:
+                    nearest_customer = candidates[0]
+                else:
+                    feasible_customers = remaining_customers.feasible(
+                        self.capacity - current_load
+                    )
+                    if len(feasible_customers) > 0:
+                        distances = self.distance_matrix[
+                            last_customer - 1, feasible_customers - 1
+                        ]
+                        nearest_customer = int(feasible_customers[np.argmin(distances)])
 
                 if nearest_customer is None:
                     break
@@ -46,8 +78,9 @@ class GreedySearch:
         return routes
 
     def generate_randomized_greedy_solution(self, random_factor=0.5, k=3):
-        remaining_customers = list(range(1, self.dimension + 1))
-        remaining_customers.remove(self.depot)
+        remaining_customers = CustomerSet(
+            self.instance.customers, self.instance.demand_array
+        )
 
         routes = []
         while remaining_customers:
@@ -56,25 +89,34 @@ class GreedySearch:
 
             while remaining_customers:
                 last_customer = current_route[-1]
-                nearest_customers = []
-
-                for customer in remaining_customers:
-                    demand = self.demands[customer - 1][1]
-                    if current_load + demand <= self.capacity:
-                        distance = self.distance_matrix[last_customer - 1][customer - 1]
-                        nearest_customers.append((customer, distance))
+                nearest_customers = self.nearest_candidates(
+                    last_customer, remaining_customers, current_load, k
+                )
+
+                # Fewer than k feasible neighbors: rank all remaining customers
+                # that fit (only the k nearest of them are ever used)
+                if len(nearest_customers) < k:
+                    feasible_customers = remaining_customers.feasible(
+                        self.capacity - current_load
+                    )
+                    distances = self.distance_matrix[
+                        last_customer - 1, feasible_customers - 1
+                    ]
+                    nearest = np.argsort(distances, kind="stable")[:k]
+                    nearest_customers = feasible_customers[nearest].tolist()
 
                 if not nearest_customers:
                     break
 
-                nearest_customers.sort(key=lambda x: x[1])
-
-                if len(nearest_customers) > k - 1 and random.random() < random_factor:
+                if (
+                    len(nearest_customers) > k - 1
+                    and self.random.random() < random_factor
+                ):
                     # Randomly select one of the top k nearest customers
-                    nearest_customer = random.choice(nearest_customers[:k])[0]
+                    nearest_customer = self.random.choice(nearest_customers[:k])
                 else:
                     # Select the nearest customer
-                    nearest_customer = nearest_customers[0][0]
+                    nearest_customer = nearest_customers[0]
 
                 current_route.append(nearest_customer)
                 current_load += self.demands[nearest_customer - 1][1]
@@ -85,20 +127,48 @@ class GreedySearch:
 
         return routes
 
-    def run(self, iterations=100, alpha=1.0, beta=100.0):
-        best_solution = self.generate_greedy_solution()
-        best_fitness, best_total_distance, best_number_of_vehicles = calculate_fitness(
-            best_solution, self.distance_matrix, alpha, beta
-        )
+    # polish: improve the best solution found with LocalSearch at the end.
+    # initial_solution: start from these routes (e.g. the previous plan)
+    # instead of the deterministic greedy solution.
+    def run(
+        self,
+        iterations=100,
+        alpha=1.0,
+        beta=100.0,
+        stopping=None,
+        polish=False,
+        profiler=None,
+        initial_solution=None,
+    ):
+        if stopping is not None:
+            stopping.start()
+        section = null_section
+        if profiler is not None:
+            profiler.start()
+            section = profiler.section
+
+        with section("construction"):
+            if initial_solution is None:
+                best_solution = self.generate_greedy_solution()
+            else:
+                best_solution = [list(route) for route in initial_solution]
+        with section("evaluation"):
+            best_fitness, best_total_distance, best_number_of_vehicles = (
+                calculate_fitness(best_solution, self.distance_matrix, alpha, beta)
+            )
+        if stopping is not None:
+            stopping.record(best_fitness, best_solution, 1)
 
         worst_fitness = float("-inf")
         total_fitness_sum = 0
 
-        for _ in range(iterations):
-            solution = self.generate_randomized_greedy_solution()
-            fitness, total_distance, number_of_vehicles = calculate_fitness(
-                solution, self.distance_matrix, alpha, beta
-            )
+        for iteration in range(iterations):
+            with section("construction"):
+                solution = self.generate_randomized_greedy_solution()
+            with section("evaluation"):
+                fitness, total_distance, number_of_vehicles = calculate_fitness(
+                    solution, self.distance_matrix, alpha, beta
+                )
 
             total_fitness_sum += fitness
             if fitness > worst_fitness:
@@ -110,7 +180,23 @@ class GreedySearch:
                 best_total_distance = total_distance
                 best_number_of_vehicles = number_of_vehicles
 
-        average_fitness = total_fitness_sum / iterations
+            if profiler is not None:
+                profiler.record(iteration, best_fitness, fitness, iteration + 2)
+            if stopping is not None and stopping.update(fitness, solution, 1):
+                break
+
+        average_fitness = total_fitness_sum / (iteration + 1)
+
+        if polish:
+            best_solution = [route[:] for route in best_solution]
+            with section("local_search"):
+                best_fitness, best_total_distance, best_number_of_vehicles = (
+                    LocalSearch(self.instance).improve(
+                        best_solution, alpha=alpha, beta=beta
+                    )
+                )
+            if stopping is not None:
+                stopping.record(best_fitness, best_solution, 1)
 
         return (
             best_solution,
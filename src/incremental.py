@@ -0,0 +1,112 @@
+import numpy as np
+from local_search import LocalSearch
+from utils import calculate_fitness
+
+
+# Re-plans an existing solution after orders were added or cancelled, without
+# solving from scratch. Cancelled customers are taken out of their routes, new
+# customers are inserted at their cheapest feasible position, and LocalSearch
+# then repairs only the routes that changed: its moves start from the
+# customers of those routes. instance must already contain the new customers
+# (see Instance.add_customers) and may have the cancelled ones deactivated
+# (Instance.remove_customers).
+class IncrementalSearch:
+    def __init__(self, instance, neighbor_count=20):
+        self.instance = instance
+        self.depot = instance.depot
+        self.capacity = instance.capacity
+        self.demands = instance.demands
+        self.distance_matrix = instance.distance_matrix
+        self.neighbors = instance.nearest_neighbors(neighbor_count)
+        self.local_search = LocalSearch(instance, neighbor_count)
+
+    # Takes the customers out of the solution in place; routes left empty are
+    # dropped. Returns the routes that changed.
+    def remove(self, solution, customers):
+        customers = set(customers)
+        changed = []
+        for route in solution:
+            kept = [node for node in route[1:-1] if node not in customers]
+            if len(kept) < len(route) - 2:
+                route[1:-1] = kept
+                changed.append(route)
+        solution[:] = [route for route in solution if len(route) > 2]
+        return [route for route in changed if len(route) > 2]
+
+    # Cheapest feasible insertion of customer into the solution as (added
+    # distance, route index, position). Only the routes of its nearest
+    # neighbors are tried, unless none of them has room. Costs come from the
+    # customer's own distance row.
+    def best_insertion(self, solution, loads, route_of, customer):
+        demand = self.demands[customer - 1][1]
+        row = self.distance_matrix[customer - 1]
+        candidates = {route_of[v] for v in self.neighbors[customer - 1]} - {None}
+        candidates = [idx for idx in candidates if loads[idx] + demand <= self.capacity]
+        if not candidates:
+            candidates = [
+                idx
+                for idx in range(len(solution))
+                if loads[idx] + demand <= self.capacity
+            ]
+
+        best = (float("inf"), None, None)
+        for route_idx in sorted(candidates):
+            nodes = np.asarray(solution[route_idx], dtype=np.intp) - 1
+            costs = (
+                row[nodes[:-1]]
+                + row[nodes[1:]]
+                - self.distance_matrix[nodes[:-1], nodes[1:]]
+            )
+            position = int(np.argmin(costs))
+            if costs[position] < best[0]:
+                best = (float(costs[position]), route_idx, position + 1)
+        return best
+
+    # Inserts the customers into the solution in place, each at its cheapest
+    # feasible position or in a new route. Returns the routes that changed.
+    def insert(self, solution, customers):
+        loads = [
+            sum(self.demands[node - 1][1] for node in route[1:-1]) for route in solution
+        ]
+        route_of = [None] * (self.instance.dimension + 1)
+        for route_idx, route in enumerate(solution):
+            for node in route[1:-1]:
+                route_of[node] = route_idx
+
+        changed = set()
+        for customer in customers:
+            _, route_idx, position = self.best_insertion(
+                solution, loads, route_of, customer
+            )
+            if route_idx is None:
+                route_idx = len(solution)
+                solution.append([self.depot, self.depot])
+                loads.append(0)
+                position = 1
+            solution[route_idx].insert(position, customer)
+            loads[route_idx] += self.demands[customer - 1][1]
+            route_of[customer] = route_idx
+            changed.add(route_idx)
+        return [solution[route_idx] for route_idx in sorted(changed)]
+
+    # Applies the order changes to solution (a list of routes, changed in
+    # place) and repairs the affected routes with at most max_moves local
+    # search moves. Returns (fitness, total_distance, number_of_vehicles).
+    def reoptimize(
+        self,
+        solution,
+        added=(),
+        removed=(),
+        max_moves=None,
+        alpha=1.0,
+        beta=100.0,
+    ):
+        changed = self.remove(solution, removed) + self.insert(solution, added)
+        customers = list(
+            dict.fromkeys(node for route in changed for node in route[1:-1])
+        )
+        if not customers:
+            return calculate_fitness(solution, self.distance_matrix, alpha, beta)
+        return self.local_search.improve(
+            solution, max_moves, alpha, beta, customers=customers
+        )
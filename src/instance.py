@@ -0,0 +1,149 @@
+import copy
+import numpy as np
+from utils import calculate_nearest_neighbors, euclidean_distance
+from distance import create_distances, temporary_matrix_path
+
+
+# Parsed problem data shared by every solver. The distance matrix is built on
+# first access and then reused, so several solvers on the same instance only
+# pay for it once. name and best_known (the optimal or best known total
+# distance, if the file states it) are optional metadata. Instances with
+# explicit edge weights (or a cached matrix) pass distance_matrix directly;
+# node_coords is then only needed for display. Otherwise distances selects
+# the distance backend (see distance.BACKENDS) and distance_path the file of
+# the memmap backend (by default a new file in the temporary directory).
+# inactive nodes (cancelled customers, see remove_customers) keep their number
+# and distances but are not part of customers.
+class Instance:
+    def __init__(
+        self,
+        dimension,
+        capacity,
+        node_coords,
+        demands,
+        depot,
+        rounded=False,
+        dtype=np.float64,
+        name=None,
+        best_known=None,
+        edge_weight_type="EUC_2D",
+        distance_matrix=None,
+        distances="dense",
+        distance_path=None,
+        inactive=(),
+    ):
+        self.name = name
+        self.best_known = best_known
+        self.dimension = dimension
+        self.capacity = capacity
+        self.node_coords = node_coords
+        self.demands = demands
+        self.depot = depot
+        self.rounded = rounded
+        self.dtype = dtype
+        self.edge_weight_type = edge_weight_type
+        self.distances = distances
+        self.distance_path = distance_path
+        self.inactive = frozenset(inactive)
+        self._distance_matrix = distance_matrix
+        self._demand_array = None
+        self._nearest_neighbors = {}
+
+    @property
+    def distance_matrix(self):
+        if self._distance_matrix is None:
+            if self.distances == "memmap" and self.distance_path is None:
+                self.distance_path = temporary_matrix_path()
+            self._distance_matrix = create_distances(
+                self.distances,
+                self.node_coords,
+                self.rounded,
+                self.dtype,
+                self.edge_weight_type,
+                self.distance_path,
+            )
+        return self._distance_matrix
+
+    # A memory-mapped matrix is pickled (e.g. for worker processes) without
+    # its data and mapped again from its file on first use
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.distances == "memmap" and self.distance_path is not None:
+            state["_distance_matrix"] = None
+        return state
+
+    @property
+    def customers(self):
+        return [
+            node
+            for node in range(1, self.dimension + 1)
+            if node != self.depot and node not in self.inactive
+        ]
+
+    # demand_array[node - 1] is the demand of node, as with the distance matrix
+    @property
+    def demand_array(self):
+        if self._demand_array is None:
+            self._demand_array = np.array(
+                [demand for _, demand in self.demands], dtype=np.int64
+            )
+        return self._demand_array
+
+    # nearest_neighbors(k)[node - 1] lists the k nodes closest to node (the
+    # depot included), nearest first. Computed once per k.
+    def nearest_neighbors(self, k):
+        if k not in self._nearest_neighbors:
+            self._nearest_neighbors[k] = (
+                calculate_nearest_neighbors(self.distance_matrix, k) + 1
+            ).tolist()
+        return self._nearest_neighbors[k]
+
+    # Copy of the instance with new customers at the given (x, y) coordinates
+    # appended as nodes dimension + 1, dimension + 2, ... Returns the new
+    # instance and the new nodes. A dense matrix that was already built is
+    # reused: only the rows and columns of the new nodes are computed.
+    def add_customers(self, coordinates, demands):
+        if self.edge_weight_type == "EXPLICIT":
+            raise ValueError(
+                "Cannot add customers to an instance with explicit weights"
+            )
+
+        nodes = list(range(self.dimension + 1, self.dimension + len(coordinates) + 1))
+        new_coords = np.column_stack((nodes, np.asarray(coordinates, dtype=np.float64)))
+        node_coords = np.vstack(
+            (np.asarray(self.node_coords, dtype=np.float64), new_coords)
+        )
+
+        instance = copy.copy(self)
+        instance.dimension = len(node_coords)
+        instance.node_coords = node_coords
+        instance.demands = list(self.demands) + [
+            (node, int(demand)) for node, demand in zip(nodes, demands)
+        ]
+        instance.distance_path = None
+        instance._distance_matrix = None
+        instance._demand_array = None
+        instance._nearest_neighbors = {}
+
+        if self.distances == "dense" and self._distance_matrix is not None:
+            old = self.dimension
+            rows = euclidean_distance(
+                new_coords[:, 1, None] - node_coords[None, :, 1],
+                new_coords[:, 2, None] - node_coords[None, :, 2],
+                self.rounded,
+                self.dtype,
+                self.edge_weight_type,
+            )
+            matrix = np.empty((instance.dimension, instance.dimension), rows.dtype)
+            matrix[:old, :old] = self._distance_matrix
+            matrix[old:] = rows
+            matrix[:old, old:] = rows[:, :old].T
+            instance._distance_matrix = matrix
+        return instance, nodes
+
+    # Copy of the instance without the given customers, sharing its distances
+    # and neighbor lists
+    def remove_customers(self, customers):
+        instance = copy.copy(self)
+        instance.inactive = self.inactive | set(customers)
+        return instance
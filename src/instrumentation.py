@@ -0,0 +1,111 @@
+import csv
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+_null_section = nullcontext()
+
+
+# Stand-in for Profiler.section when no profiler is given: every section is the
+# same shared no-op context manager
+def null_section(name, count=1):
+    return _null_section
+
+
+class Section:
+    __slots__ = ("profiler", "name", "count", "started")
+
+    def __init__(self, profiler, name, count):
+        self.profiler = profiler
+        self.name = name
+        self.count = count
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.profiler.timers[self.name] += time.perf_counter() - self.started
+        self.profiler.counters[self.name] += self.count
+
+
+# Counters, timers and a convergence trace for one solver run. Solvers take it
+# as run(profiler=...) and time their hot sections with
+#     with section("crossover"):
+# where section is profiler.section, or null_section when profiling is off, so
+# an unprofiled run only pays for entering a shared no-op context. Timings are
+# collected per section; count is the number of items the section handled
+# (e.g. children crossed over), so the export also gives the time per item.
+# The trace holds one entry per generation or iteration.
+class Profiler:
+    def __init__(self):
+        self.start()
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.counters = defaultdict(int)
+        self.timers = defaultdict(float)
+        self.trace = []
+
+    def section(self, name, count=1):
+        return Section(self, name, count)
+
+    def count(self, name, count=1):
+        self.counters[name] += count
+
+    # One trace entry: the best fitness so far and the fitness of the current
+    # generation's best individual or the current tabu solution
+    def record(self, iteration, best_fitness, current_fitness, evaluations=0):
+        self.trace.append(
+            {
+                "iteration": iteration,
+                "elapsed": time.perf_counter() - self.start_time,
+                "best_fitness": best_fitness,
+                "current_fitness": current_fitness,
+                "evaluations": evaluations,
+            }
+        )
+
+    def summary(self):
+        return {
+            "elapsed": time.perf_counter() - self.start_time,
+            "sections": {
+                name: {
+                    "seconds": self.timers[name],
+                    "count": self.counters[name],
+                }
+                for name in sorted(set(self.timers) | set(self.counters))
+            },
+            "trace": self.trace,
+        }
+
+    # Writes <name>_profile.json (sections and trace) and <name>_trace.csv
+    def export(self, directory, name):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{name}_profile.json"), "w") as file:
+            json.dump(self.summary(), file, indent=2)
+
+        with open(
+            os.path.join(directory, f"{name}_trace.csv"), "w", newline=""
+        ) as file:
+            writer = csv.writer(file, delimiter=";")
+            writer.writerow(
+                [
+                    "Iteration",
+                    "Elapsed",
+                    "Best Fitness",
+                    "Current Fitness",
+                    "Evaluations",
+                ]
+            )
+            for entry in self.trace:
+                writer.writerow(
+                    [
+                        entry["iteration"],
+                        entry["elapsed"],
+                        entry["best_fitness"],
+                        entry["current_fitness"],
+                        entry["evaluations"],
+                    ]
+                )
@@ -0,0 +1,194 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from utils import calculate_fitness, make_rng
+from genetic_algorithm import GeneticAlgorithm
+
+TOPOLOGIES = ("ring", "fully_connected")
+
+# Instance of the current worker process, set once by the pool initializer
+_instance = None
+
+
+def _init_worker(instance):
+    global _instance
+    _instance = instance
+
+
+# Evolves one island for a number of generations. An island without a
+# population yet starts from a fresh initial population that includes
+# initial_population. Every call draws from its own generator seeded with
+# seed, so results do not depend on which worker runs which island.
+def evolve_island(
+    population_fitness,
+    seed,
+    generations,
+    params,
+    instance=None,
+    initial_population=None,
+):
+    algorithm = GeneticAlgorithm(instance or _instance, seed)
+
+    if population_fitness is None:
+        population_fitness = algorithm.calculate_fitness_population(
+            algorithm.generate_initial_population(
+                params["population_size"], initial_population
+            )
+        )
+
+    population_fitness, worst_fitness, total_fitness_sum, fitness_count, _ = (
+        algorithm.evolve(population_fitness, generations, **params)
+    )
+    return (
+        population_fitness,
+        worst_fitness,
+        total_fitness_sum,
+        fitness_count,
+        algorithm.evaluations,
+    )
+
+
+# Island-model GA: several populations evolve independently in worker processes
+# and every migration_interval generations send copies of their best
+# individuals to their neighbors, where they replace the worst ones. With the
+# ring topology island i receives from island i - 1; fully connected islands
+# receive from every other island. run(initial_population=...) seeds every
+# island's first population with the given solutions.
+class IslandGeneticAlgorithm:
+    # seed: int, None or a random.Random to draw the island seeds from
+    def __init__(self, instance, seed=None):
+        self.instance = instance
+        self.depot = instance.depot
+        self.distance_matrix = instance.distance_matrix
+        self.islands = None
+        self.evaluations = 0
+        self.random = make_rng(seed)
+
+    def best_island_individual(self):
+        return min((island[0] for island in self.islands), key=lambda x: x[1][0])
+
+    def migrate(self, islands, migrants, topology):
+        emigrants = [
+            [(individual.copy(), fitness) for individual, fitness in island[:migrants]]
+            for island in islands
+        ]
+
+        for island_idx, island in enumerate(islands):
+            if topology == "ring":
+                incoming = emigrants[island_idx - 1]
+            else:
+                incoming = [
+                    migrant
+                    for source_idx, source in enumerate(emigrants)
+                    if source_idx != island_idx
+                    for migrant in source
+                ]
+            islands[island_idx] = sorted(island + incoming, key=lambda x: x[1][0])[
+                : len(island)
+            ]
+
+        return islands
+
+    def run(
+        self,
+        generations=1000,
+        population_size=100,
+        crossover_rate=0.8,
+        mutation_rate=0.05,
+        tournament_size=5,
+        islands=4,
+        migration_interval=50,
+        migrants=2,
+        topology="ring",
+        workers=None,
+        batch_crossover=False,
+        education_rate=0.0,
+        stopping=None,
+        initial_population=None,
+    ):
+        if topology not in TOPOLOGIES:
+            raise ValueError(f"Unknown migration topology: {topology}")
+        if stopping is not None:
+            stopping.start()
+
+        params = {
+            "population_size": population_size,
+            "crossover_rate": crossover_rate,
+            "mutation_rate": mutation_rate,
+            "tournament_size": tournament_size,
+            "batch_crossover": batch_crossover,
+            "education_rate": education_rate,
+        }
+        self.islands = [None] * islands
+        self.evaluations = 0
+
+        worst_fitness = float("-inf")
+        total_fitness_sum = 0
+        fitness_count = 0
+
+        with ProcessPoolExecutor(
+            max_workers=workers or min(islands, os.cpu_count()),
+            initializer=_init_worker,
+            initargs=(self.instance,),
+        ) as executor:
+            remaining = generations
+            while remaining > 0:
+                epoch = min(migration_interval, remaining)
+                futures = [
+                    executor.submit(
+                        evolve_island,
+                        island,
+                        self.random.getrandbits(64),
+                        epoch,
+                        params,
+                        None,
+                        initial_population if island is None else None,
+                    )
+                    for island in self.islands
+                ]
+
+                epoch_evaluations = 0
+                for island_idx, future in enumerate(futures):
+                    (
+                        population_fitness,
+                        island_worst,
+                        island_sum,
+                        island_count,
+                        evaluations,
+                    ) = future.result()
+                    self.islands[island_idx] = population_fitness
+                    worst_fitness = max(worst_fitness, island_worst)
+                    total_fitness_sum += island_sum
+                    fitness_count += island_count
+                    epoch_evaluations += evaluations
+
+                self.evaluations += epoch_evaluations
+                remaining -= epoch
+
+                # Stopping criteria are checked between epochs
+                if stopping is not None:
+                    best_individual, best_fitness = self.best_island_individual()
+                    if stopping.update(
+                        best_fitness[0],
+                        best_individual.routes(self.depot),
+                        epoch_evaluations,
+                    ):
+                        break
+
+                if remaining > 0:
+                    self.islands = self.migrate(self.islands, migrants, topology)
+
+        average_fitness = total_fitness_sum / fitness_count
+
+        best_individual = self.best_island_individual()[0].routes(self.depot)
+        best_fitness, best_total_distance, best_number_of_vehicles = calculate_fitness(
+            best_individual, self.distance_matrix
+        )
+
+        return (
+            best_individual,
+            best_fitness,
+            worst_fitness,
+            average_fitness,
+            best_total_distance,
+            best_number_of_vehicles,
+        )
@@ -0,0 +1,122 @@
+import os
+import numpy as np
+
+# Optional compiled versions of the remaining scalar hot loops. When Numba is
+# installed the solvers use them automatically (set CVRP_DISABLE_NUMBA=1 to
+# force the pure-Python paths); results are identical either way because the
+# kernels perform the same floating-point operations in the same order.
+# Compiled code is cached on disk, so only the very first run pays for JIT
+# compilation.
+try:
+    from numba import njit
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        def decorator(function):
+            return function
+
+        return decorator
+
+
+use_numba = NUMBA_AVAILABLE and os.environ.get("CVRP_DISABLE_NUMBA") != "1"
+
+
+# Shortest-path labels of Prins' split (see GiantTour.split) over a customer
+# order, given the distances from and to the depot of each customer, the
+# distances between consecutive customers and their demands. Routes may be
+# loaded up to max_load, paying penalty per unit of load above capacity.
+@njit(cache=True)
+def split_predecessors(
+    from_depot, to_depot, between, demand, capacity, alpha, beta, penalty, max_load
+):
+    n = len(demand)
+    potential = np.full(n + 1, np.inf)
+    potential[0] = 0.0
+    predecessor = np.zeros(n + 1, dtype=np.int64)
+
+    for i in range(n):
+        load = 0
+        distance = 0.0
+        for j in range(i, n):
+            load += demand[j]
+            if load > max_load and j > i:
+                break
+            if j == i:
+                distance = from_depot[j]
+            else:
+                distance += between[j - 1]
+            cost = potential[i] + alpha * (distance + to_depot[j]) + beta
+            if load > capacity:
+                cost += penalty * (load - capacity)
+            if cost < potential[j + 1]:
+                potential[j + 1] = cost
+                predecessor[j + 1] = i
+
+    return predecessor
+
+
+# Distance deltas of every intra-route swap of a solution in flat form (see
+# utils.flatten_population), in the order TabuSearch.get_neighbors yields them.
+# Returns the route index, both positions and the delta of each move.
+@njit(cache=True)
+def route_swap_deltas(nodes, route_starts, distance_matrix):
+    route_count = len(route_starts) - 1
+    move_count = 0
+    for route_idx in range(route_count):
+        customers = route_starts[route_idx + 1] - route_starts[route_idx] - 2
+        move_count += customers * (customers - 1) // 2
+
+    move_routes = np.empty(move_count, dtype=np.int64)
+    move_i = np.empty(move_count, dtype=np.int64)
+    move_j = np.empty(move_count, dtype=np.int64)
+    deltas = np.empty(move_count, dtype=distance_matrix.dtype)
+
+    move = 0
+    for route_idx in range(route_count):
+        start = route_starts[route_idx]
+        length = route_starts[route_idx + 1] - start
+        for i in range(1, length - 1):
+            for j in range(i + 1, length - 1):
+                x = nodes[start + i] - 1
+                y = nodes[start + j] - 1
+                prev_i = nodes[start + i - 1] - 1
+                next_j = nodes[start + j + 1] - 1
+
+                # Same expressions as evaluation.swap_distance_delta
+                if j == i + 1:
+                    removed = (
+                        distance_matrix[prev_i, x]
+                        + distance_matrix[x, y]
+                        + distance_matrix[y, next_j]
+                    )
+                    added = (
+                        distance_matrix[prev_i, y]
+                        + distance_matrix[y, x]
+                        + distance_matrix[x, next_j]
+                    )
+                else:
+                    next_i = nodes[start + i + 1] - 1
+                    prev_j = nodes[start + j - 1] - 1
+                    removed = (
+                        distance_matrix[prev_i, x]
+                        + distance_matrix[x, next_i]
+                        + distance_matrix[prev_j, y]
+                        + distance_matrix[y, next_j]
+                    )
+                    added = (
+                        distance_matrix[prev_i, y]
+                        + distance_matrix[y, next_i]
+                        + distance_matrix[prev_j, x]
+                        + distance_matrix[x, next_j]
+                    )
+
+                move_routes[move] = route_idx
+                move_i[move] = i
+                move_j[move] = j
+                deltas[move] = added - removed
+                move += 1
+
+    return move_routes, move_i, move_j, deltas
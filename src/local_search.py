@@ -0,0 +1,292 @@
+import numpy as np
+from evaluation import RouteCache
+
+OPERATORS = ("relocate", "or_opt", "swap_star", "two_opt_star", "two_opt")
+
+# Moves must improve the fitness by more than this to be applied
+EPSILON = 1e-9
+
+# Largest dimension for which the distance matrix is copied into nested lists
+# for fast single lookups (about 32 MB at this size)
+DISTANCE_ROWS_LIMIT = 1000
+
+
+# Improvement engine over inter- and intra-route moves, usable on its own (to
+# polish any solution) or from within the other solvers. Moves are restricted
+# to the nearest neighbors of each customer: for a customer u and a neighbor v
+# every operator tries to make u and v adjacent.
+#   relocate      move u next to v in v's route
+#   or_opt        move the chain of 2 or 3 customers starting at u behind v
+#   swap_star     exchange u and v, inserting each at its best position in the
+#                 other route
+#   two_opt_star  exchange the route tails after u and from v on
+#   two_opt       reverse the segment between u and v (same route)
+# The first improving move is applied (first improvement) and the scan repeats
+# until no move improves the solution or max_moves is reached. Capacity is
+# checked against the cached route loads, and moves that empty a route save
+# a vehicle.
+class LocalSearch:
+    def __init__(self, instance, neighbor_count=20, operators=OPERATORS):
+        unknown = set(operators) - set(OPERATORS)
+        if unknown:
+            raise ValueError(f"Unknown local search operators: {sorted(unknown)}")
+
+        self.instance = instance
+        self.depot = instance.depot
+        self.capacity = instance.capacity
+        self.demands = instance.demands
+        self.distance_matrix = instance.distance_matrix
+        # Python floats add up exactly like float64 array values, so results do
+        # not change
+        self.distance_rows = None
+        if (
+            isinstance(self.distance_matrix, np.ndarray)
+            and self.distance_matrix.dtype == np.float64
+            and instance.dimension <= DISTANCE_ROWS_LIMIT
+        ):
+            self.distance_rows = self.distance_matrix.tolist()
+        self.neighbors = instance.nearest_neighbors(neighbor_count)
+        self.head_loads = None
+        self.operators = [getattr(self, operator) for operator in operators]
+        self.moves = 0
+        self.evaluations = 0
+
+    # Route index and position of every customer
+    def positions(self, solution):
+        positions = [None] * (self.instance.dimension + 1)
+        for route_idx, route in enumerate(solution):
+            self.route_positions(positions, route_idx, route)
+        return positions
+
+    def route_positions(self, positions, route_idx, route):
+        for i in range(1, len(route) - 1):
+            positions[route[i]] = (route_idx, i)
+
+    # Load of every customer's route from the depot up to and including it
+    def route_head_loads(self, solution):
+        head_loads = [0] * (self.instance.dimension + 1)
+        for route in solution:
+            self.update_head_loads(head_loads, route)
+        return head_loads
+
+    def update_head_loads(self, head_loads, route):
+        load = 0
+        for node in route[1:-1]:
+            load += self.demands[node - 1][1]
+            head_loads[node] = load
+
+    # Brings positions and head loads up to date after a move between the
+    # routes route_u and route_v. Only those routes changed, unless a route
+    # was emptied and removed, which shifts the indices of the routes after it
+    # and needs a full rebuild.
+    def refresh(self, solution, positions, route_count, route_u, route_v):
+        if len(solution) != route_count:
+            return self.positions(solution), self.route_head_loads(solution)
+        for route_idx in {route_u, route_v}:
+            self.route_positions(positions, route_idx, solution[route_idx])
+            self.update_head_loads(self.head_loads, solution[route_idx])
+        return positions, self.head_loads
+
+    # Improves the solution (a list of routes) in place and returns its
+    # (fitness, total_distance, number_of_vehicles). customers limits the
+    # moves to those starting from the given customers (by default all of
+    # them), e.g. the customers of the routes that changed.
+    def improve(self, solution, max_moves=None, alpha=1.0, beta=100.0, customers=None):
+        route_cache = RouteCache(
+            solution,
+            self.distance_matrix,
+            self.demands,
+            alpha,
+            beta,
+            self.distance_rows,
+        )
+        if customers is None:
+            customers = self.instance.customers
+        moves = 0
+        improved = True
+
+        while improved:
+            improved = False
+            positions = self.positions(solution)
+            self.head_loads = self.route_head_loads(solution)
+            for u in customers:
+                if max_moves is not None and moves >= max_moves:
+                    break
+                for v in self.neighbors[u - 1]:
+                    # Neighbors may be inactive (not in the solution)
+                    if v == self.depot or positions[v] is None:
+                        continue
+                    route_count = len(solution)
+                    route_u, route_v = positions[u][0], positions[v][0]
+                    if self.try_moves(route_cache, positions, u, v):
+                        moves += 1
+                        improved = True
+                        positions, self.head_loads = self.refresh(
+                            solution, positions, route_count, route_u, route_v
+                        )
+                        break
+
+        self.moves += moves
+        return route_cache.fitness()
+
+    def try_moves(self, route_cache, positions, u, v):
+        for operator in self.operators:
+            self.evaluations += 1
+            if operator(route_cache, positions, u, v):
+                return True
+        return False
+
+    def relocate(self, route_cache, positions, u, v):
+        route_u, i = positions[u]
+        route_v, j = positions[v]
+        if route_u == route_v or not route_cache.relocate_feasible(
+            route_u, i, route_v, self.capacity
+        ):
+            return False
+
+        # Behind v, then in front of v
+        for position in (j + 1, j):
+            if route_cache.relocate_delta(route_u, i, route_v, position) < -EPSILON:
+                route_cache.apply_relocate(route_u, i, route_v, position)
+                return True
+        return False
+
+    def or_opt(self, route_cache, positions, u, v):
+        route_u, i = positions[u]
+        route_v, j = positions[v]
+        if route_u == route_v:
+            return False
+
+        source = route_cache.routes[route_u]
+        target = route_cache.routes[route_v]
+        dist = route_cache.dist
+        next_v = target[j + 1]
+
+        for length in (2, 3):
+            end = i + length - 1
+            if end > len(source) - 2:
+                break
+            chain = source[i : end + 1]
+            load = sum(route_cache.demand(node) for node in chain)
+            if route_cache.loads[route_v] + load > self.capacity:
+                continue
+
+            prev_chain, next_chain = source[i - 1], source[end + 1]
+            distance_delta = (
+                dist(prev_chain, next_chain)
+                - dist(prev_chain, chain[0])
+                - dist(chain[-1], next_chain)
+                + dist(v, chain[0])
+                + dist(chain[-1], next_v)
+                - dist(v, next_v)
+            )
+            vehicle_delta = -1 if len(source) == length + 2 else 0
+            delta = (
+                route_cache.alpha * distance_delta + route_cache.beta * vehicle_delta
+            )
+            if delta < -EPSILON:
+                route_cache.replace_route(
+                    route_v, target[: j + 1] + chain + target[j + 1 :]
+                )
+                route_cache.replace_route(route_u, source[:i] + source[end + 1 :])
+                route_cache.remove_empty_routes()
+                return True
+        return False
+
+    # Cheapest position to insert node into route, ignoring position skip
+    # (the customer being exchanged out). Returns (added distance, position).
+    def best_insertion(self, route_cache, route, node, skip):
+        dist = route_cache.dist
+        best_cost, best_position = float("inf"), None
+        prev = route[0]
+        for position in range(1, len(route)):
+            if position == skip:
+                continue
+            current = route[position]
+            cost = dist(prev, node) + dist(node, current) - dist(prev, current)
+            if cost < best_cost:
+                best_cost, best_position = cost, position
+            prev = current
+        return best_cost, best_position
+
+    def swap_star(self, route_cache, positions, u, v):
+        route_u, i = positions[u]
+        route_v, j = positions[v]
+        if route_u == route_v or not route_cache.inter_swap_feasible(
+            route_u, i, route_v, j, self.capacity
+        ):
+            return False
+
+        source = route_cache.routes[route_u]
+        target = route_cache.routes[route_v]
+        dist = route_cache.dist
+        removal_u = dist(source[i - 1], source[i + 1]) - dist(source[i - 1], u)
+        removal_u -= dist(u, source[i + 1])
+        removal_v = dist(target[j - 1], target[j + 1]) - dist(target[j - 1], v)
+        removal_v -= dist(v, target[j + 1])
+
+        insertion_v, position_v = self.best_insertion(route_cache, source, v, i)
+        insertion_u, position_u = self.best_insertion(route_cache, target, u, j)
+
+        distance_delta = removal_u + removal_v + insertion_v + insertion_u
+        if route_cache.alpha * distance_delta >= -EPSILON:
+            return False
+
+        new_source = source[:position_v] + [v] + source[position_v:]
+        new_source.remove(u)
+        new_target = target[:position_u] + [u] + target[position_u:]
+        new_target.remove(v)
+        route_cache.replace_route(route_u, new_source)
+        route_cache.replace_route(route_v, new_target)
+        return True
+
+    def two_opt_star(self, route_cache, positions, u, v):
+        route_u, i = positions[u]
+        route_v, j = positions[v]
+        if route_u == route_v:
+            return False
+
+        source = route_cache.routes[route_u]
+        target = route_cache.routes[route_v]
+        head_u = self.head_loads[u]
+        head_v = self.head_loads[v] - route_cache.demand(v)
+        tail_u = route_cache.loads[route_u] - head_u
+        tail_v = route_cache.loads[route_v] - head_v
+        if head_u + tail_v > self.capacity or head_v + tail_u > self.capacity:
+            return False
+
+        # u is followed by v and the rest of v's route; the head of v's route
+        # continues with the rest of u's route
+        dist = route_cache.dist
+        prev_v, next_u = target[j - 1], source[i + 1]
+        distance_delta = (
+            dist(u, v) + dist(prev_v, next_u) - dist(u, next_u) - dist(prev_v, v)
+        )
+        vehicle_delta = -1 if j == 1 and i == len(source) - 2 else 0
+        delta = route_cache.alpha * distance_delta + route_cache.beta * vehicle_delta
+        if delta >= -EPSILON:
+            return False
+
+        route_cache.replace_route(route_u, source[: i + 1] + target[j:])
+        route_cache.replace_route(route_v, target[:j] + source[i + 1 :])
+        route_cache.remove_empty_routes()
+        return True
+
+    def two_opt(self, route_cache, positions, u, v):
+        route_u, i = positions[u]
+        route_v, j = positions[v]
+        if route_u != route_v:
+            return False
+
+        # Reversing the segment between them makes u and v adjacent
+        if i < j:
+            start, end = i + 1, j
+        else:
+            start, end = j, i - 1
+        if start >= end:
+            return False
+
+        if route_cache.two_opt_delta(route_u, start, end) < -EPSILON:
+            route_cache.apply_two_opt(route_u, start, end)
+            return True
+        return False
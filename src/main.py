@@ -1,10 +1,9 @@
 import os
 import csv
+from collections import Counter
 from file_handler import read_file, log_results
-from random_search import RandomSearch
-from greedy_search import GreedySearch
-from genetic_algorithm import GeneticAlgorithm
-from tabu_search import TabuSearch
+from scheduler import ALGORITHMS, Job, run_jobs
+from utils import spawn_seeds
 
 data_dir = "data"
 results_dir = "results"
@@ -12,51 +11,70 @@ os.makedirs(results_dir, exist_ok=True)
 
 
 # All algorithms are run on all instances and logs are in -> results/overall_results.csv
-def run_all():
-    for file_name in os.listdir(data_dir):
-        if file_name.endswith(".vrp"):
-            instance = read_file(os.path.join(data_dir, file_name))
-
-            algorithms = [
-                RandomSearch(**instance),
-                GreedySearch(**instance),
-                GeneticAlgorithm(**instance),
-                TabuSearch(**instance),
-            ]
-            for algorithm in algorithms:
-                _, best_fitness, worst_fitness, avg_fitness, _, _ = algorithm.run(1000)
-                log_results(
-                    results_dir,
-                    file_name,
-                    algorithm.__class__.__name__,
-                    best_fitness,
-                    worst_fitness,
-                    avg_fitness,
-                )
+# Runs are spread over `workers` processes (all cores by default); results are
+# written by this process only, as the runs finish. With a seed every run gets
+# its own seed derived from it, so results can be reproduced. With profile,
+# every run is instrumented and its timings and convergence trace are written
+# to results/profiles/<instance>_<algorithm>_<run>_{profile.json,trace.csv}.
+def run_all(workers=None, runs=1, seed=None, profile=False):
+    instances = {
+        file_name: read_file(os.path.join(data_dir, file_name))
+        for file_name in sorted(os.listdir(data_dir))
+        if file_name.endswith(".vrp")
+    }
+
+    jobs = []
+    run_seeds = iter(spawn_seeds(seed, len(instances) * len(ALGORITHMS) * runs))
+    for file_name in instances:
+        for algorithm in ALGORITHMS:
+            params = (
+                {"generations": 1000}
+                if algorithm == "GeneticAlgorithm"
+                else {"iterations": 1000}
+            )
+            for run in range(runs):
+                jobs.append(Job(file_name, algorithm, params, next(run_seeds), profile))
+
+    finished_runs = Counter()
+    for job, result, profiler in run_jobs(instances, jobs, workers):
+        _, best_fitness, worst_fitness, avg_fitness, _, _ = result
+        log_results(
+            results_dir,
+            job.instance_name,
+            job.algorithm,
+            best_fitness,
+            worst_fitness,
+            avg_fitness,
+        )
+
+        if profiler is not None:
+            run = finished_runs[job.instance_name, job.algorithm]
+            finished_runs[job.instance_name, job.algorithm] += 1
+            instance_name = os.path.splitext(job.instance_name)[0]
+            profiler.export(
+                os.path.join(results_dir, "profiles"),
+                f"{instance_name}_{job.algorithm}_{run}",
+            )
 
 
 # Run experiments on population size, crossover rate, and mutation rate for GA -> results/population_experiment.csv, results/crossover_experiment.csv, results/mutation_experiment.csv
-def run_experiment(instance, filename, variable, values):
+# With a seed every value is run with that same seed, so runs differ only in
+# the parameter under test.
+def run_experiment(instance, filename, variable, values, workers=None, seed=None):
+    jobs = [
+        Job("instance", "GeneticAlgorithm", {variable: value}, seed) for value in values
+    ]
+    results = {
+        job.params[variable]: result
+        for job, result, _ in run_jobs({"instance": instance}, jobs, workers)
+    }
+
     with open(os.path.join(results_dir, filename), "w", newline="") as csv_file:
         writer = csv.writer(csv_file)
         writer.writerow(["Parameter Value", "Best", "Worst", "Avg"])
 
         for value in values:
-            algorithm = GeneticAlgorithm(**instance)
-
-            if variable == "population_size":
-                best_solution, best_fitness, worst_fitness, avg_fitness, _, _ = (
-                    algorithm.run(population_size=value)
-                )
-            elif variable == "crossover_rate":
-                best_solution, best_fitness, worst_fitness, avg_fitness, _, _ = (
-                    algorithm.run(crossover_rate=value)
-                )
-            elif variable == "mutation_rate":
-                best_solution, best_fitness, worst_fitness, avg_fitness, _, _ = (
-                    algorithm.run(mutation_rate=value)
-                )
-
+            _, best_fitness, worst_fitness, avg_fitness, _, _ = results[value]
             writer.writerow([value, best_fitness, worst_fitness, avg_fitness])
 
 
@@ -1,19 +1,29 @@
-import random
-from utils import calculate_distance_matrix, calculate_fitness
+from instrumentation import null_section
+from utils import (
+    calculate_fitness,
+    calculate_fitness_batch,
+    flatten_population,
+    CustomerSet,
+    make_rng,
+)
 
 
 class RandomSearch:
-    def __init__(self, dimension, capacity, node_coords, demands, depot):
-        self.dimension = dimension
-        self.capacity = capacity
-        self.node_coords = node_coords
-        self.demands = demands
-        self.depot = depot
-        self.distance_matrix = calculate_distance_matrix(self.node_coords)
+    # seed: int, None or a random.Random to draw from (see utils.make_rng)
+    def __init__(self, instance, seed=None):
+        self.instance = instance
+        self.dimension = instance.dimension
+        self.capacity = instance.capacity
+        self.node_coords = instance.node_coords
+        self.demands = instance.demands
+        self.depot = instance.depot
+        self.distance_matrix = instance.distance_matrix
+        self.random = make_rng(seed)
 
     def generate_random_solution(self):
-        remaining_customers = list(range(1, self.dimension + 1))
-        remaining_customers.remove(self.depot)
+        remaining_customers = CustomerSet(
+            self.instance.customers, self.instance.demand_array
+        )
 
         routes = []
         current_route = []
@@ -22,50 +32,111 @@ class RandomSearch:
         current_route.append(self.depot)
 
         while remaining_customers:
-            customer = random.choice(remaining_customers)
+            customer = remaining_customers.sample(self.random)
             demand = self.demands[customer - 1][1]
 
-            if current_load + demand <= self.capacity:
-                current_route.append(customer)
-                current_load += demand
-                remaining_customers.remove(customer)
-            else:
-                current_route.append(self.depot)
-                routes.append(current_route)
-                current_route = [self.depot]
-                current_load = 0
+            if current_load + demand > self.capacity:
+                # Draw again among the customers that still fit, and only close
+                # the route when there are none, to avoid nearly empty routes
+                feasible_customers = remaining_customers.feasible(
+                    self.capacity - current_load
+                )
+                if len(feasible_customers) == 0:
+                    current_route.append(self.depot)
+                    routes.append(current_route)
+                    current_route = [self.depot]
+                    current_load = 0
+                    continue
+
+                customer = int(self.random.choice(feasible_customers))
+                demand = self.demands[customer - 1][1]
+
+            current_route.append(customer)
+            current_load += demand
+            remaining_customers.remove(customer)
 
         current_route.append(self.depot)
         routes.append(current_route)
 
         return routes
 
-    def run(self, iterations=100, alpha=1.0, beta=100.0):
+    # Solutions are generated batch_size at a time and scored together with
+    # calculate_fitness_batch. initial_solution (e.g. the previous plan) is
+    # the incumbent to beat.
+    def run(
+        self,
+        iterations=100,
+        alpha=1.0,
+        beta=100.0,
+        stopping=None,
+        batch_size=32,
+        profiler=None,
+        initial_solution=None,
+    ):
+        if stopping is not None:
+            stopping.start()
+        section = null_section
+        if profiler is not None:
+            profiler.start()
+            section = profiler.section
+
         best_solution = None
         best_fitness = float("inf")
         best_total_distance = None
         best_number_of_vehicles = None
+        if initial_solution is not None:
+            best_solution = [list(route) for route in initial_solution]
+            best_fitness, best_total_distance, best_number_of_vehicles = (
+                calculate_fitness(best_solution, self.distance_matrix, alpha, beta)
+            )
+            if stopping is not None:
+                stopping.record(best_fitness, best_solution, 1)
 
         worst_fitness = float("-inf")
         total_fitness_sum = 0
 
-        for _ in range(iterations):
-            solution = self.generate_random_solution()
-            fitness, total_distance, number_of_vehicles = calculate_fitness(
-                solution, self.distance_matrix, alpha, beta
+        iteration = 0
+        stopped = False
+        while iteration < iterations and not stopped:
+            count = min(batch_size, iterations - iteration)
+            with section("construction", count):
+                batch = [self.generate_random_solution() for _ in range(count)]
+            with section("evaluation", count):
+                fitness, total_distance, number_of_vehicles, _ = (
+                    calculate_fitness_batch(
+                        *flatten_population(batch),
+                        self.distance_matrix,
+                        self.instance.demand_array,
+                        self.capacity,
+                        alpha,
+                        beta,
+                    )
+                )
+            batch_fitness = zip(
+                fitness.tolist(), total_distance.tolist(), number_of_vehicles.tolist()
             )
 
-            total_fitness_sum += fitness
-            if fitness > worst_fitness:
-                worst_fitness = fitness
-
-            if fitness < best_fitness:
-                best_fitness = fitness
-                best_solution = solution
-                best_total_distance = total_distance
-                best_number_of_vehicles = number_of_vehicles
-
-        average_fitness = total_fitness_sum / iterations
+            for solution, (fitness, total_distance, number_of_vehicles) in zip(
+                batch, batch_fitness
+            ):
+                iteration += 1
+                total_fitness_sum += fitness
+                if fitness > worst_fitness:
+                    worst_fitness = fitness
+
+                if fitness < best_fitness:
+                    best_fitness = fitness
+                    best_solution = solution
+                    best_total_distance = total_distance
+                    best_number_of_vehicles = number_of_vehicles
+
+                if profiler is not None:
+                    profiler.record(iteration - 1, best_fitness, fitness, iteration)
+                if stopping is not None and stopping.update(fitness, solution, 1):
+                    stopped = True
+                    break
+
+        average_fitness = total_fitness_sum / iteration
 
         return (
             best_solution,
@@ -0,0 +1,68 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from random_search import RandomSearch
+from greedy_search import GreedySearch
+from genetic_algorithm import GeneticAlgorithm
+from tabu_search import TabuSearch
+from instrumentation import Profiler
+
+ALGORITHMS = {
+    "RandomSearch": RandomSearch,
+    "GreedySearch": GreedySearch,
+    "GeneticAlgorithm": GeneticAlgorithm,
+    "TabuSearch": TabuSearch,
+}
+
+# One solver run: instance_name is a key of the instances passed to run_jobs,
+# algorithm a key of ALGORITHMS, params the keyword arguments of run() and
+# seed the seed of the run's own random number generator (None for an
+# unseeded run). With profile set the run is instrumented with a Profiler.
+Job = namedtuple(
+    "Job",
+    ["instance_name", "algorithm", "params", "seed", "profile"],
+    defaults=(False,),
+)
+
+# Instances of the current worker process, set once by the pool initializer
+_instances = None
+
+
+def _init_worker(instances):
+    global _instances
+    _instances = instances
+
+
+def run_job(job, instances=None):
+    instance = (instances or _instances)[job.instance_name]
+    algorithm = ALGORITHMS[job.algorithm](instance, seed=job.seed)
+    if not job.profile:
+        return algorithm.run(**job.params), None
+
+    profiler = Profiler()
+    return algorithm.run(**job.params, profiler=profiler), profiler
+
+
+# Runs the jobs on a pool of worker processes and yields (job, result,
+# profiler) as they finish, result being the 6-tuple returned by run() and
+# profiler the job's Profiler (None unless job.profile is set). Instances are
+# handed to each worker once when it starts (inherited without copying where
+# processes are forked) rather than with every job, and their distance
+# matrices are built here first so no worker recomputes them.
+def run_jobs(instances, jobs, workers=None):
+    for instance in instances.values():
+        instance.distance_matrix
+
+    if workers == 1:
+        for job in jobs:
+            yield (job, *run_job(job, instances))
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        initializer=_init_worker,
+        initargs=(instances,),
+    ) as executor:
+        futures = {executor.submit(run_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            yield (futures[future], *future.result())
@@ -0,0 +1,349 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from file_handler import parse_text
+from scheduler import ALGORITHMS
+from stopping import StoppingCriteria
+
+# Latencies kept for the percentiles reported by /metrics
+LATENCY_WINDOW = 1000
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    500: "Internal Server Error",
+}
+
+# Solver parameters a client may set, by algorithm, with their JSON types.
+# Arguments that reach the server's files or objects (checkpoint, resume,
+# profiler, stopping) are never exposed; time_limit sets the stopping
+# criterion instead.
+INT = (int,)
+NUMBER = (int, float)
+FLAG = (bool,)
+OPTIONAL_INT = (int, type(None))
+PARAMS = {
+    "RandomSearch": {
+        "iterations": INT,
+        "alpha": NUMBER,
+        "beta": NUMBER,
+        "batch_size": INT,
+    },
+    "GreedySearch": {
+        "iterations": INT,
+        "alpha": NUMBER,
+        "beta": NUMBER,
+        "polish": FLAG,
+    },
+    "GeneticAlgorithm": {
+        "generations": INT,
+        "population_size": INT,
+        "crossover_rate": NUMBER,
+        "mutation_rate": NUMBER,
+        "tournament_size": INT,
+        "deduplicate": FLAG,
+        "batch_crossover": FLAG,
+        "education_rate": NUMBER,
+        "hybrid": FLAG,
+        "education_moves": OPTIONAL_INT,
+    },
+    "TabuSearch": {
+        "iterations": INT,
+        "first_improvement": FLAG,
+        "candidate_list_size": OPTIONAL_INT,
+        "aspiration": FLAG,
+        "granularity": OPTIONAL_INT,
+        "local_search": FLAG,
+    },
+}
+
+
+class RequestError(Exception):
+    pass
+
+
+# bool is an int in Python, but true is not a number in JSON
+def has_type(value, types):
+    return isinstance(value, types) and (bool in types or not isinstance(value, bool))
+
+
+# Parsed instances of the current worker process by (content hash, rounded),
+# least recently used first. Each worker keeps its own, so a repeated instance
+# skips parsing and distance computation in every worker that has seen it.
+_instances = OrderedDict()
+_cache_size = 16
+
+
+def _init_worker(cache_size):
+    global _cache_size
+    _cache_size = cache_size
+
+
+def cached_instance(digest, text, rounded):
+    key = (digest, rounded)
+    instance = _instances.get(key)
+    if instance is not None:
+        _instances.move_to_end(key)
+        return instance, True
+
+    instance = parse_text(text, rounded=rounded)
+    instance.distance_matrix
+    _instances[key] = instance
+    if len(_instances) > _cache_size:
+        _instances.popitem(last=False)
+    return instance, False
+
+
+# Runs one request in a worker process. Returns the best routes with their
+# fitness, the solve time and whether the instance came from the cache. An
+# instance that cannot be parsed and parameter values the solver rejects are
+# raised as RequestError.
+def solve(digest, text, algorithm, params, seed, rounded, time_limit):
+    try:
+        instance, cached = cached_instance(digest, text, rounded)
+    except Exception as error:
+        raise RequestError(
+            f"'instance' could not be read: {type(error).__name__}: {error}"
+        )
+    if time_limit is not None:
+        params = dict(params, stopping=StoppingCriteria(time_limit=time_limit))
+
+    start = time.perf_counter()
+    try:
+        routes, fitness, _, _, total_distance, number_of_vehicles = ALGORITHMS[
+            algorithm
+        ](instance, seed=seed).run(**params)
+    except ValueError as error:
+        raise RequestError(f"invalid params for {algorithm}: {error}")
+    return {
+        "routes": [[int(node) for node in route] for route in routes],
+        "fitness": fitness,
+        "total_distance": total_distance,
+        "number_of_vehicles": number_of_vehicles,
+        "solve_time": time.perf_counter() - start,
+        "cached": cached,
+    }
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+# Long-running solver service: an asyncio HTTP/1.1 front end (TCP or Unix
+# socket) and a pool of worker processes that run the solvers. At most
+# `workers` requests run at a time; the others wait in a queue without blocking
+# the event loop, so /metrics and new requests are always answered.
+#   POST /solve    {"instance": <.vrp file contents>, "algorithm": <name>,
+#                   "params": {...}, "seed": int, "rounded": bool,
+#                   "time_limit": seconds} -> routes and fitness
+#   GET /metrics   queue depth, running requests, counts, latencies and
+#                  instance cache hits
+#   GET /health
+class SolverService:
+    def __init__(self, workers=None, cache_size=16):
+        self.workers = workers or os.cpu_count()
+        self.cache_size = cache_size
+        self.executor = None
+        self.slots = None
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.wait_times = deque(maxlen=LATENCY_WINDOW)
+
+    def start(self):
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.cache_size,),
+        )
+        self.slots = asyncio.Semaphore(self.workers)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def metrics(self):
+        latency = {"count": len(self.latencies)}
+        for name, values in (("latency", self.latencies), ("wait", self.wait_times)):
+            if values:
+                latency[f"{name}_mean"] = sum(values) / len(values)
+                latency[f"{name}_p50"] = percentile(values, 0.5)
+                latency[f"{name}_p95"] = percentile(values, 0.95)
+                latency[f"{name}_max"] = max(values)
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "latency": latency,
+        }
+
+    async def solve(self, request):
+        text = request.get("instance")
+        algorithm = request.get("algorithm")
+        if not isinstance(text, str):
+            raise RequestError("'instance' must be the contents of a .vrp file")
+        if algorithm not in ALGORITHMS:
+            raise RequestError(f"'algorithm' must be one of {list(ALGORITHMS)}")
+        params = request.get("params", {})
+        if not isinstance(params, dict):
+            raise RequestError("'params' must be an object")
+        accepted = PARAMS[algorithm]
+        unknown = sorted(set(params) - set(accepted))
+        if unknown:
+            raise RequestError(
+                f"unknown params for {algorithm}: {unknown}, "
+                f"accepted: {sorted(accepted)}"
+            )
+        for name, value in params.items():
+            if not has_type(value, accepted[name]):
+                raise RequestError(f"'params.{name}' has the wrong type")
+        seed = request.get("seed")
+        if not has_type(seed, OPTIONAL_INT):
+            raise RequestError("'seed' must be an integer")
+        time_limit = request.get("time_limit")
+        if time_limit is not None and not has_type(time_limit, NUMBER):
+            raise RequestError("'time_limit' must be a number of seconds")
+
+        digest = hashlib.sha256(text.encode()).hexdigest()
+        received = time.perf_counter()
+        self.queued += 1
+        try:
+            async with self.slots:
+                self.queued -= 1
+                self.running += 1
+                started = time.perf_counter()
+                try:
+                    result = await asyncio.get_running_loop().run_in_executor(
+                        self.executor,
+                        solve,
+                        digest,
+                        text,
+                        algorithm,
+                        params,
+                        seed,
+                        bool(request.get("rounded", False)),
+                        time_limit,
+                    )
+                finally:
+                    self.running -= 1
+        except Exception:
+            self.failed += 1
+            raise
+
+        finished = time.perf_counter()
+        self.completed += 1
+        self.wait_times.append(started - received)
+        self.latencies.append(finished - received)
+        if result["cached"]:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+
+        result["instance_hash"] = digest
+        result["latency"] = finished - received
+        return result
+
+    async def route(self, method, path, body):
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok"}
+        if method == "GET" and path == "/metrics":
+            return 200, self.metrics()
+        if method == "POST" and path == "/solve":
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError:
+                raise RequestError("body must be JSON")
+            if not isinstance(request, dict):
+                raise RequestError("body must be a JSON object")
+            return 200, await self.solve(request)
+        return 404, {"error": f"no route for {method} {path}"}
+
+    # One request per connection: request line, headers and a body of
+    # Content-Length bytes
+    async def handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+            try:
+                status, payload = await self.route(method, path, body)
+            except RequestError as error:
+                status, payload = 400, {"error": str(error)}
+            except Exception as error:
+                status, payload = 500, {"error": f"{type(error).__name__}: {error}"}
+
+            data = json.dumps(payload).encode()
+            writer.write(
+                (
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    "Connection: close\r\n\r\n"
+                ).encode()
+                + data
+            )
+            await writer.drain()
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8080, unix_socket=None):
+        self.start()
+        try:
+            if unix_socket is not None:
+                server = await asyncio.start_unix_server(self.handle, unix_socket)
+            else:
+                server = await asyncio.start_server(self.handle, host, port)
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Run the CVRP solver service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix-socket", help="listen on this Unix socket instead")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=16,
+        help="parsed instances kept per worker (default: 16)",
+    )
+    args = parser.parse_args(args)
+
+    service = SolverService(args.workers, args.cache_size)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
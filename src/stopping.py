@@ -0,0 +1,77 @@
+import math
+import time
+
+
+# Stopping criteria shared by all solvers. Every limit is optional and the
+# search stops as soon as any of them is reached (or the solver's own
+# iteration count runs out):
+#   time_limit        wall-clock seconds since the run started
+#   max_evaluations   number of fitness evaluations
+#   target_fitness    stop once the best fitness is at or below this value
+#   stagnation_limit  iterations in a row without improving the best fitness
+# callback(solution, fitness, elapsed) is called with every new incumbent, and
+# best_solution / best_fitness always hold the best-so-far, so a result is
+# available at any time.
+class StoppingCriteria:
+    def __init__(
+        self,
+        time_limit=None,
+        max_evaluations=None,
+        target_fitness=None,
+        stagnation_limit=None,
+        callback=None,
+    ):
+        self.time_limit = time_limit
+        self.max_evaluations = max_evaluations
+        self.target_fitness = target_fitness
+        self.stagnation_limit = stagnation_limit
+        self.callback = callback
+        self.start()
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.iterations = 0
+        self.evaluations = 0
+        self.stagnant_iterations = 0
+        self.best_fitness = math.inf
+        self.best_solution = None
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    # Called once per iteration with the best fitness (and its solution, as a
+    # list of routes) of that iteration
+    def record(self, fitness, solution, evaluations=0):
+        self.iterations += 1
+        self.evaluations += evaluations
+
+        if fitness < self.best_fitness:
+            self.best_fitness = fitness
+            self.best_solution = [route[:] for route in solution]
+            self.stagnant_iterations = 0
+            if self.callback is not None:
+                self.callback(self.best_solution, fitness, self.elapsed())
+        else:
+            self.stagnant_iterations += 1
+
+    def should_stop(self):
+        return (
+            (self.time_limit is not None and self.elapsed() >= self.time_limit)
+            or (
+                self.max_evaluations is not None
+                and self.evaluations >= self.max_evaluations
+            )
+            or (
+                self.target_fitness is not None
+                and self.best_fitness <= self.target_fitness
+            )
+            or (
+                self.stagnation_limit is not None
+                and self.stagnant_iterations >= self.stagnation_limit
+            )
+        )
+
+    # record() followed by should_stop(), for use at the end of an iteration
+    def update(self, fitness, solution, evaluations=0):
+        self.record(fitness, solution, evaluations)
+        return self.should_stop()
@@ -1,78 +1,310 @@
-from utils import calculate_distance_matrix, calculate_fitness
+import os
+import numpy as np
+import kernels
+from utils import calculate_fitness, flatten_population, make_rng
 from random_search import RandomSearch
+from evaluation import RouteCache
+from local_search import LocalSearch
+from instrumentation import null_section
+from checkpoint import (
+    decode_solution,
+    decode_tabu_list,
+    encode_random,
+    encode_solution,
+    encode_tabu_list,
+    load_checkpoint,
+    restore_random,
+    save_checkpoint,
+)
 
 
 class TabuSearch:
-    def __init__(
-        self, dimension, capacity, node_coords, demands, depot, tabu_tenure=10
-    ):
-        self.dimension = dimension
-        self.capacity = capacity
-        self.node_coords = node_coords
-        self.demands = demands
-        self.depot = depot
-        self.distance_matrix = calculate_distance_matrix(self.node_coords)
-        self.tabu_list = []
+    # seed: int, None or a random.Random to draw from (see utils.make_rng)
+    def __init__(self, instance, tabu_tenure=10, seed=None):
+        self.instance = instance
+        self.dimension = instance.dimension
+        self.capacity = instance.capacity
+        self.node_coords = instance.node_coords
+        self.demands = instance.demands
+        self.depot = instance.depot
+        self.distance_matrix = instance.distance_matrix
+        self.tabu_list = {}
         self.tabu_tenure = tabu_tenure
         self.best_solution = None
         self.best_cost = float("inf")
+        self.random = make_rng(seed)
 
     def generate_initial_solution(self):
         initial_solution = RandomSearch(
-            self.dimension, self.capacity, self.node_coords, self.demands, self.depot
+            self.instance, self.random
         ).generate_random_solution()
         return initial_solution
 
+    # Lazily yields intra-route swap moves as (route_idx, i, j) descriptors;
+    # nothing is copied until a move is chosen and applied
     def get_neighbors(self, solution):
-        neighbors = []
         for route_idx, route in enumerate(solution):
             for i in range(1, len(route) - 1):
                 for j in range(i + 1, len(route) - 1):
-                    if route[i] != self.depot and route[j] != self.depot:
-                        new_route = route[:]
-                        new_route[i], new_route[j] = new_route[j], new_route[i]
-                        new_solution = solution[:]
-                        new_solution[route_idx] = new_route
-                        neighbors.append(new_solution)
-        return neighbors
-
-    def is_tabu(self, move):
-        return move in self.tabu_list
-
-    def add_to_tabu_list(self, move):
-        self.tabu_list.append(move)
-        if len(self.tabu_list) > self.tabu_tenure:
-            self.tabu_list.pop(0)
-
-    def run(self, iterations=1000):
-        current_solution = self.generate_initial_solution()
-        current_cost = calculate_fitness(current_solution, self.distance_matrix)[0]
-        self.best_solution = current_solution
-        self.best_cost = current_cost
+                    yield route_idx, i, j
+
+    # Granular variant of get_neighbors: only swaps that place a customer next
+    # to one of its k nearest neighbors (in neighbors) are generated, so the
+    # neighborhood has O(n * k) moves instead of O(n * route length). A move
+    # may be yielded more than once.
+    def get_granular_neighbors(self, solution, neighbors):
+        position = {}
+        for route_idx, route in enumerate(solution):
+            for idx in range(1, len(route) - 1):
+                position[route[idx]] = (route_idx, idx)
+
+        for route_idx, route in enumerate(solution):
+            for i in range(1, len(route) - 1):
+                for customer in neighbors[route[i - 1] - 1]:
+                    other = position.get(customer)
+                    if other is not None and other[0] == route_idx and other[1] != i:
+                        yield route_idx, min(i, other[1]), max(i, other[1])
+
+    # Full swap neighborhood scored in one compiled pass (kernels.use_numba).
+    # Moves are tried from cheapest to dearest, ties in generation order, so
+    # the first admissible one is the move the generator scan would pick.
+    def best_swap_compiled(
+        self, solution, route_cache, current_cost, iteration, aspiration
+    ):
+        nodes, route_starts, _ = flatten_population([solution])
+        move_routes, move_i, move_j, deltas = kernels.route_swap_deltas(
+            nodes, route_starts, self.distance_matrix
+        )
+        costs = current_cost + route_cache.alpha * deltas
+
+        for k in np.argsort(costs, kind="stable").tolist():
+            move = (int(move_routes[k]), int(move_i[k]), int(move_j[k]))
+            neighbor_cost = float(costs[k])
+            if not self.is_tabu(solution, move, iteration) or (
+                aspiration and neighbor_cost < self.best_cost
+            ):
+                return move, neighbor_cost, len(costs)
+
+        return None, float("inf"), len(costs)
+
+    # Tabu memory maps (customer, route_idx, position) to the iteration at which
+    # it expires. A swap puts route[i] at position j and route[j] at position i,
+    # and is tabu if either customer would return to a position it recently left.
+    def is_tabu(self, solution, move, iteration):
+        route_idx, i, j = move
+        route = solution[route_idx]
+        return (
+            self.tabu_list.get((route[i], route_idx, j), 0) > iteration
+            or self.tabu_list.get((route[j], route_idx, i), 0) > iteration
+        )
+
+    # Must be called before the move is applied
+    def add_to_tabu_list(self, solution, move, iteration):
+        route_idx, i, j = move
+        route = solution[route_idx]
+        expiry = iteration + self.tabu_tenure
+        self.tabu_list[(route[i], route_idx, i)] = expiry
+        self.tabu_list[(route[j], route_idx, j)] = expiry
+
+    # The state of a run before iteration iteration: current and best solution
+    # with their costs, tabu memory, random generator and run statistics
+    def save_checkpoint(self, path, iteration, current_solution, current_cost, stats):
+        best_fitness, worst_fitness, total_fitness_sum, evaluations = stats
+        save_checkpoint(
+            path,
+            "TabuSearch",
+            self.instance,
+            iteration=iteration,
+            current_cost=current_cost,
+            best_cost=self.best_cost,
+            best_fitness=best_fitness,
+            worst_fitness=worst_fitness,
+            total_fitness_sum=total_fitness_sum,
+            evaluations=evaluations,
+            tabu_list=encode_tabu_list(self.tabu_list),
+            **encode_solution(current_solution, "current"),
+            **encode_solution(self.best_solution, "best"),
+            **encode_random(self.random),
+        )
+
+    # Restores the state saved by save_checkpoint and returns the iteration,
+    # the current solution and cost and the run statistics
+    def load_checkpoint(self, path):
+        state = load_checkpoint(path, "TabuSearch", self.instance)
+        restore_random(self.random, state)
+        self.tabu_list = decode_tabu_list(state["tabu_list"])
+        self.best_solution = decode_solution(state, "best")
+        self.best_cost = float(state["best_cost"])
+        stats = (
+            float(state["best_fitness"]),
+            float(state["worst_fitness"]),
+            float(state["total_fitness_sum"]),
+            int(state["evaluations"]),
+        )
+        return (
+            int(state["iteration"]),
+            decode_solution(state, "current"),
+            float(state["current_cost"]),
+            stats,
+        )
+
+    # first_improvement: take the first admissible move that improves the
+    # current solution instead of scanning the whole neighborhood.
+    # candidate_list_size: evaluate at most this many admissible moves per
+    # iteration (None scans them all).
+    # aspiration: accept a tabu move if it leads to a new best solution.
+    # granularity: restrict swaps to the given number of nearest neighbors
+    # (None uses the full swap neighborhood).
+    # local_search: improve the initial solution and every new best solution
+    # with the inter-route moves of LocalSearch, so routes can be merged. The
+    # tabu memory is cleared whenever it rewrites the current solution.
+    # initial_solution: start from these routes (e.g. the previous plan)
+    # instead of a random solution.
+    # checkpoint: file the run's state is saved to every checkpoint_interval
+    # iterations and at the end. resume: continue from that file if it
+    # exists; iterations counts the iterations of the whole run, so a resumed
+    # run (with the same parameters and seed) ends exactly as the
+    # uninterrupted run would.
+    def run(
+        self,
+        iterations=1000,
+        first_improvement=False,
+        candidate_list_size=None,
+        aspiration=True,
+        granularity=None,
+        local_search=False,
+        stopping=None,
+        profiler=None,
+        initial_solution=None,
+        checkpoint=None,
+        checkpoint_interval=1000,
+        resume=False,
+    ):
+        if stopping is not None:
+            stopping.start()
+        section = null_section
+        if profiler is not None:
+            profiler.start()
+            section = profiler.section
 
+        self.tabu_list = {}
+        neighbors = (
+            None
+            if granularity is None
+            else self.instance.nearest_neighbors(granularity)
+        )
+        # The compiled scan needs the distances as an array (see distance.py)
+        compiled = kernels.use_numba and isinstance(self.distance_matrix, np.ndarray)
+        improver = LocalSearch(self.instance) if local_search else None
+        start = 0
         best_fitness = float("inf")
         worst_fitness = float("-inf")
         total_fitness_sum = 0
+        evaluations = 0
 
-        for _ in range(iterations):
-            neighbors = self.get_neighbors(current_solution)
-            best_neighbor = None
+        if resume and checkpoint is not None and os.path.exists(checkpoint):
+            start, current_solution, current_cost, stats = self.load_checkpoint(
+                checkpoint
+            )
+            best_fitness, worst_fitness, total_fitness_sum, evaluations = stats
+            route_cache = RouteCache(
+                current_solution, self.distance_matrix, self.demands
+            )
+        else:
+            with section("construction"):
+                if initial_solution is None:
+                    current_solution = self.generate_initial_solution()
+                else:
+                    current_solution = [list(route) for route in initial_solution]
+            if improver is not None:
+                with section("local_search"):
+                    improver.improve(current_solution)
+            route_cache = RouteCache(
+                current_solution, self.distance_matrix, self.demands
+            )
+            current_cost = route_cache.fitness()[0]
+            self.best_solution = [route[:] for route in current_solution]
+            self.best_cost = current_cost
+
+        iteration = start - 1
+        for iteration in range(start, iterations):
+            if (
+                checkpoint is not None
+                and iteration > start
+                and iteration % checkpoint_interval == 0
+            ):
+                with section("checkpoint"):
+                    self.save_checkpoint(
+                        checkpoint,
+                        iteration,
+                        current_solution,
+                        current_cost,
+                        (best_fitness, worst_fitness, total_fitness_sum, evaluations),
+                    )
+
+            best_move = None
             best_neighbor_cost = float("inf")
+            evaluated = 0
+
+            with section("neighbors"):
+                if compiled and not (
+                    neighbors is not None or first_improvement or candidate_list_size
+                ):
+                    best_move, best_neighbor_cost, evaluated = self.best_swap_compiled(
+                        current_solution,
+                        route_cache,
+                        current_cost,
+                        iteration,
+                        aspiration,
+                    )
+                else:
+                    if neighbors is None:
+                        moves = self.get_neighbors(current_solution)
+                    else:
+                        moves = self.get_granular_neighbors(current_solution, neighbors)
+
+                    admissible = 0
+                    for move in moves:
+                        neighbor_cost = current_cost + route_cache.swap_delta(*move)
+                        evaluated += 1
+                        if self.is_tabu(current_solution, move, iteration) and not (
+                            aspiration and neighbor_cost < self.best_cost
+                        ):
+                            continue
 
-            for neighbor in neighbors:
-                neighbor_cost = calculate_fitness(neighbor, self.distance_matrix)[0]
-                move = (current_solution, neighbor)
-                if not self.is_tabu(move) and neighbor_cost < best_neighbor_cost:
-                    best_neighbor = neighbor
-                    best_neighbor_cost = neighbor_cost
+                        admissible += 1
+                        if neighbor_cost < best_neighbor_cost:
+                            best_move = move
+                            best_neighbor_cost = neighbor_cost
 
-            if best_neighbor and best_neighbor_cost < self.best_cost:
-                self.best_solution = best_neighbor
-                self.best_cost = best_neighbor_cost
+                        if first_improvement and best_neighbor_cost < current_cost:
+                            break
+                        if candidate_list_size and admissible >= candidate_list_size:
+                            break
 
-            current_solution = best_neighbor
-            current_cost = best_neighbor_cost
-            self.add_to_tabu_list((current_solution, best_neighbor))
+            evaluations += evaluated
+            if profiler is not None:
+                profiler.count("evaluation", evaluated)
+
+            if best_move is not None:
+                with section("move"):
+                    self.add_to_tabu_list(current_solution, best_move, iteration)
+                    route_cache.apply_swap(*best_move)
+                current_cost = best_neighbor_cost
+
+                if current_cost < self.best_cost:
+                    if improver is not None:
+                        with section("local_search"):
+                            improver.improve(current_solution)
+                        # The moves change routes and positions, so the tabu
+                        # memory no longer refers to the same placements
+                        self.tabu_list = {}
+                        route_cache = RouteCache(
+                            current_solution, self.distance_matrix, self.demands
+                        )
+                        current_cost = route_cache.fitness()[0]
+                    self.best_solution = [route[:] for route in current_solution]
+                    self.best_cost = current_cost
 
             total_fitness_sum += current_cost
 
@@ -81,7 +313,24 @@ class TabuSearch:
             if current_cost > worst_fitness:
                 worst_fitness = current_cost
 
-        average_fitness = total_fitness_sum / iterations
+            if profiler is not None:
+                profiler.record(iteration, self.best_cost, current_cost, evaluations)
+            if stopping is not None and stopping.update(
+                current_cost, current_solution, evaluated
+            ):
+                break
+
+        if checkpoint is not None:
+            with section("checkpoint"):
+                self.save_checkpoint(
+                    checkpoint,
+                    iteration + 1,
+                    current_solution,
+                    current_cost,
+                    (best_fitness, worst_fitness, total_fitness_sum, evaluations),
+                )
+
+        average_fitness = total_fitness_sum / (iteration + 1)
 
         best_individual = self.best_solution
         best_fitness, best_total_distance, best_number_of_vehicles = calculate_fitness(
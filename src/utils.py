@@ -1,31 +1,188 @@
-import math
+import random
+import numpy as np
 
 
-def calculate_distance_matrix(node_coords):
-    num_nodes = len(node_coords)
-    distance_matrix = [[0 for _ in range(num_nodes)] for _ in range(num_nodes)]
+# Distances for coordinate differences dx, dy (scalars or arrays). Every
+# distance backend goes through here, so they all agree to the last bit.
+# edge_weight_type is EUC_2D or CEIL_2D (rounded up, regardless of rounded).
+def euclidean_distance(
+    dx, dy, rounded=False, dtype=np.float64, edge_weight_type="EUC_2D"
+):
+    distance = np.hypot(dx, dy)
 
-    for i in range(num_nodes):
-        for j in range(num_nodes):
-            if i != j:
-                x1, y1 = node_coords[i][1], node_coords[i][2]
-                x2, y2 = node_coords[j][1], node_coords[j][2]
-                distance_matrix[i][j] = math.sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2)
+    if edge_weight_type == "CEIL_2D":
+        distance = np.ceil(distance)
+    # TSPLIB EUC_2D convention: nint(sqrt(dx^2 + dy^2))
+    elif rounded:
+        distance = np.floor(distance + 0.5)
 
-    return distance_matrix
+    return distance.astype(dtype, copy=False)
+
+
+# node_coords: (node, x, y) rows, as tuples or an array
+def calculate_distance_matrix(
+    node_coords, rounded=False, dtype=np.float64, edge_weight_type="EUC_2D"
+):
+    coords = np.asarray(node_coords, dtype=np.float64)
+    x = coords[:, 1]
+    y = coords[:, 2]
+    return euclidean_distance(
+        x[:, None] - x[None, :],
+        y[:, None] - y[None, :],
+        rounded,
+        dtype,
+        edge_weight_type,
+    )
 
 
 # fitness = alpha * total_distance + beta * number_of_vehicles
 def calculate_fitness(solution, distance_matrix, alpha=1.0, beta=100.0):
-    total_distance = 0
-    for route in solution:
-        route_distance = 0
-        for i in range(len(route) - 1):
-            node1 = route[i] - 1
-            node2 = route[i + 1] - 1
-            route_distance += distance_matrix[node1][node2]
-        total_distance += route_distance
+    # Routes start and end at the depot, so chaining them adds only zero-length
+    # depot -> depot edges and the whole solution can be summed in one gather.
+    nodes = np.fromiter(
+        (node - 1 for route in solution for node in route), dtype=np.intp
+    )
+    total_distance = float(distance_matrix[nodes[:-1], nodes[1:]].sum())
 
     number_of_vehicles = len(solution)
     fitness = alpha * total_distance + beta * number_of_vehicles
     return fitness, total_distance, number_of_vehicles
+
+
+# Flat form of a population of solutions (lists of routes with depot sentinels):
+#   nodes           all routes of all solutions chained, as in calculate_fitness
+#   route_starts    offset of every route in nodes, plus len(nodes) at the end
+#   solution_routes index of the first route of every solution, plus the total
+def flatten_population(population):
+    route_lengths = [len(route) for solution in population for route in solution]
+    nodes = np.fromiter(
+        (node for solution in population for route in solution for node in route),
+        dtype=np.intp,
+        count=sum(route_lengths),
+    )
+    route_starts = np.zeros(len(route_lengths) + 1, dtype=np.intp)
+    np.cumsum(route_lengths, out=route_starts[1:])
+    solution_routes = np.zeros(len(population) + 1, dtype=np.intp)
+    np.cumsum([len(solution) for solution in population], out=solution_routes[1:])
+    return nodes, route_starts, solution_routes
+
+
+# calculate_fitness for a whole flattened population with one gather and a few
+# reductions. Returns arrays of fitness, total distance, number of vehicles and
+# capacity violation (total load above capacity over all routes) per solution.
+def calculate_fitness_batch(
+    nodes,
+    route_starts,
+    solution_routes,
+    distance_matrix,
+    demand_array,
+    capacity,
+    alpha=1.0,
+    beta=100.0,
+):
+    indices = nodes - 1
+
+    # Routes begin and end at the depot, so the edges joining consecutive routes
+    # are zero-length depot -> depot edges. Every solution's edges are summed on
+    # their own with the same reduction as calculate_fitness, so the results
+    # match it exactly whatever the solution's place in the batch.
+    edge_costs = distance_matrix[indices[:-1], indices[1:]]
+    solution_starts = route_starts[solution_routes].tolist()
+    total_distance = np.array(
+        [
+            float(edge_costs[start : end - 1].sum())
+            for start, end in zip(solution_starts[:-1], solution_starts[1:])
+        ]
+    )
+
+    demand_sums = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(demand_array[indices], out=demand_sums[1:])
+    loads = np.diff(demand_sums[route_starts])
+    overload_sums = np.zeros(len(loads) + 1, dtype=np.int64)
+    np.cumsum(np.maximum(loads - capacity, 0), out=overload_sums[1:])
+    capacity_violation = np.diff(overload_sums[solution_routes])
+
+    number_of_vehicles = np.diff(solution_routes)
+    fitness = alpha * total_distance + beta * number_of_vehicles
+    return fitness, total_distance, number_of_vehicles, capacity_violation
+
+
+# Indices of the k nearest other nodes of every node, nearest first. Rows are
+# processed in blocks so argpartition never needs a full n x n index array.
+def calculate_nearest_neighbors(distance_matrix, k, block_size=1024):
+    num_nodes = len(distance_matrix)
+    k = min(k, num_nodes - 1)
+    neighbors = np.empty((num_nodes, k), dtype=np.int32)
+
+    for start in range(0, num_nodes, block_size):
+        rows = np.arange(start, min(start + block_size, num_nodes))
+        block = distance_matrix[rows].copy()
+        block[np.arange(len(rows)), rows] = np.inf
+
+        nearest = np.argpartition(block, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(block, nearest, axis=1), axis=1)
+        neighbors[rows] = np.take_along_axis(nearest, order, axis=1)
+
+    return neighbors
+
+
+# Set of customers with O(1) membership, removal (the removed slot is filled
+# with the last customer) and uniform sampling. Demands are kept alongside so
+# the customers that still fit into a vehicle are found with one vector compare.
+class CustomerSet:
+    def __init__(self, customers, demand_array):
+        self.customers = np.array(customers, dtype=np.int32)
+        self.demands = demand_array[self.customers - 1]
+        self.size = len(self.customers)
+        # position[node] is the index of node in customers, or -1 if absent
+        self.position = [-1] * (len(demand_array) + 1)
+        for idx, customer in enumerate(self.customers.tolist()):
+            self.position[customer] = idx
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, customer):
+        return self.position[customer] >= 0
+
+    def __iter__(self):
+        return iter(self.customers[: self.size].tolist())
+
+    def remove(self, customer):
+        idx = self.position[customer]
+        last = self.size - 1
+        last_customer = int(self.customers[last])
+        self.customers[idx] = last_customer
+        self.demands[idx] = self.demands[last]
+        self.position[last_customer] = idx
+        self.position[customer] = -1
+        self.size = last
+
+    def sample(self, rng=random):
+        return int(self.customers[rng.randrange(self.size)])
+
+    # Customers whose demand is at most remaining_capacity
+    def feasible(self, remaining_capacity):
+        customers = self.customers[: self.size]
+        return customers[self.demands[: self.size] <= remaining_capacity]
+
+
+# Random number generator of one run. seed is an int, None (seeded from the
+# OS) or a random.Random, which is shared rather than copied, so that helper
+# objects draw from the same stream as the solver that owns them.
+def make_rng(seed=None):
+    if isinstance(seed, random.Random):
+        return seed
+    return random.Random(seed)
+
+
+# Seeds for count independent streams derived from one seed (one per run,
+# worker or island), using NumPy's SeedSequence so that the streams do not
+# overlap. Without a seed every stream is seeded from the OS.
+def spawn_seeds(seed, count):
+    if seed is None:
+        return [None] * count
+    return [
+        int(child.generate_state(1, np.uint64)[0])
+        for child in np.random.SeedSequence(seed).spawn(count)
+    ]